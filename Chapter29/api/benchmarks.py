@@ -0,0 +1,172 @@
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment, teardown_test_environment)
+
+# Benchmarks measure the work behind the endpoints: a dummy cache keeps
+# cache_response from answering and the throttles from rejecting requests.
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+# Instrumentation that would be measured along with the endpoints: silk
+# writes every request and its queries, the others time, explain or count.
+INSTRUMENTATION_MIDDLEWARE = (
+    'silk.middleware.SilkyMiddleware',
+    'api.profiling.SamplingProfilerMiddleware',
+    'api.metrics.MetricsMiddleware',
+    'api.slowqueries.SlowQueryViewMiddleware',
+    'api.nplusone.NPlusOneMiddleware',
+    'api.middleware.QueryBudgetMiddleware',
+)
+
+
+def endpoint_settings():
+    """Setting overrides that leave only the endpoints to measure."""
+    return {
+        'MIDDLEWARE': [name for name in settings.MIDDLEWARE if name not in INSTRUMENTATION_MIDDLEWARE],
+        'SILKY_INTERCEPT_PERCENT': 0,
+        'SILKY_PYTHON_PROFILER': False,
+        'SILKY_ANALYZE_QUERIES': False,
+        'PROFILER': {**getattr(settings, 'PROFILER', {}), 'ENABLED': False},
+        'SLOW_QUERY_LOG': {**getattr(settings, 'SLOW_QUERY_LOG', {}), 'ENABLED': False},
+        'NPLUSONE': {**getattr(settings, 'NPLUSONE', {}), 'ENABLED': False},
+        'QUERY_BUDGETS': {**getattr(settings, 'QUERY_BUDGETS', {}), 'ENABLED': False},
+        'SERVER_TIMING': False,
+    }
+
+
+@contextmanager
+def benchmark_database(verbosity=0, use_cache=False):
+    """
+    Run the enclosed block against a throwaway database, the same way the
+    test runner does, so benchmarks never touch development data, with the
+    instrumentation middleware off (see ``endpoint_settings``).
+    """
+    conn = connections[DEFAULT_DB_ALIAS]
+    test_settings = conn.settings_dict.setdefault('TEST', {})
+    tmpdir = None
+    if conn.vendor == 'sqlite' and not test_settings.get('NAME'):
+        # worker threads need a real file: the shared in-memory database
+        # locks whole tables on write
+        tmpdir = tempfile.mkdtemp()
+        test_settings['NAME'] = os.path.join(tmpdir, 'benchmark.sqlite3')
+
+    setup_test_environment()
+    old_name = conn.settings_dict['NAME']
+    conn.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    overrides = endpoint_settings()
+    if not use_cache:
+        overrides['CACHES'] = DUMMY_CACHES
+    try:
+        with override_settings(**overrides):
+            yield
+    finally:
+        conn.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+        if tmpdir:
+            test_settings.pop('NAME', None)
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def run_concurrently(make_request, requests, concurrency):
+    """
+    Call ``make_request(i)`` ``requests`` times from ``concurrency`` threads.
+
+    ``make_request`` returns a response; latency, SQL query count and status
+    code are recorded for each call, and the exception type for a call that
+    raises. Returns a summary dict.
+    """
+    latencies, query_counts, statuses, errors = [], [], Counter(), Counter()
+    lock = threading.Lock()
+    next_index = iter(range(requests)).__next__
+
+    def worker():
+        try:
+            while True:
+                try:
+                    i = next_index()
+                except StopIteration:
+                    return
+                try:
+                    with CaptureQueriesContext(connection) as ctx:
+                        started = time.perf_counter()
+                        response = make_request(i)
+                        elapsed = time.perf_counter() - started
+                except Exception as exc:
+                    with lock:
+                        errors[type(exc).__name__] += 1
+                    continue
+                with lock:
+                    latencies.append(elapsed)
+                    query_counts.append(len(ctx.captured_queries))
+                    statuses[response.status_code] += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'throughput_rps': len(latencies) / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'queries_min': min(query_counts, default=0),
+        'queries_max': max(query_counts, default=0),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'errors': dict(sorted(errors.items())),
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Return a list of human readable regressions of ``results`` against
+    ``baseline``. Latency and throughput may drift by ``tolerance``
+    (a fraction); query counts must not grow at all, and no request may
+    raise.
+    """
+    regressions = []
+    for name, current in results.items():
+        # the latencies of an endpoint that failed describe the requests that did not
+        failed = sum(current.get('errors', {}).values())
+        if failed:
+            regressions.append(f"{name}: {failed} request(s) raised {', '.join(current['errors'])}")
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.2f}ms -> {current['p95_ms']:.2f}ms")
+        if current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']:.1f} -> {current['throughput_rps']:.1f} req/s"
+            )
+        if current['queries_max'] > previous['queries_max']:
+            regressions.append(f"{name}: queries {previous['queries_max']} -> {current['queries_max']}")
+    return regressions
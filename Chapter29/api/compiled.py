@@ -0,0 +1,234 @@
+import inspect
+import threading
+from contextlib import contextmanager
+from functools import cached_property
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+
+from api.nplusone import detector_active
+
+_SKIP = object()
+_local = threading.local()
+_plans = {}
+
+# exact field types whose to_representation() is a plain conversion
+_CONVERTERS = {
+    serializers.CharField: str,
+    serializers.IntegerField: int,
+}
+
+
+@contextmanager
+def generic_serialization():
+    """Serialize through DRF's generic path inside the block, e.g. to compare."""
+    previous = getattr(_local, 'disabled', False)
+    _local.disabled = True
+    try:
+        yield
+    finally:
+        _local.disabled = previous
+
+
+def can_compile(serializer):
+    """
+    Only plain model serializers are compiled: a custom
+    ``to_representation()`` may do anything with the instance.
+    """
+    return (
+        isinstance(serializer, serializers.ModelSerializer)
+        and type(serializer).to_representation is serializers.Serializer.to_representation
+    )
+
+
+def _plan_field(model, field):
+    """
+    ``(kind, getter)`` describing how to read ``field`` from an instance of
+    ``model``; kind 'generic' goes through the field's own methods.
+    """
+    if isinstance(field, serializers.SerializerMethodField):
+        return 'method', None
+    attrs = field.source_attrs
+    if not attrs:
+        return 'generic', None
+
+    if isinstance(field, serializers.BaseSerializer):
+        many = isinstance(field, serializers.ListSerializer)
+        if not can_compile(field.child if many else field):
+            return 'generic', None
+        return 'many' if many else 'one', attrgetter('.'.join(attrs))
+
+    if isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField)):
+        if type(field) is serializers.PrimaryKeyRelatedField and field.pk_field is None and len(attrs) == 1:
+            try:
+                model_field = model._meta.get_field(attrs[0])
+            except FieldDoesNotExist:
+                return 'generic', None
+            if model_field.concrete and model_field.many_to_one:
+                # the foreign key column holds the primary key already
+                return 'pk', attrgetter(model_field.attname)
+        return 'generic', None
+
+    current = model
+    for position, attr in enumerate(attrs):
+        last = position == len(attrs) - 1
+        try:
+            model_field = current._meta.get_field(attr)
+        except FieldDoesNotExist:
+            static = inspect.getattr_static(current, attr, None)
+            if last and isinstance(static, (property, cached_property)):
+                return 'attribute', attrgetter('.'.join(attrs))
+            if last and inspect.isfunction(static) and _takes_no_arguments(static):
+                return 'call', attrgetter('.'.join(attrs))
+            return 'generic', None
+        if last:
+            return 'attribute', attrgetter('.'.join(attrs))
+        if not model_field.is_relation or model_field.many_to_many or model_field.one_to_many:
+            return 'generic', None
+        current = model_field.related_model
+    return 'generic', None
+
+
+def _takes_no_arguments(function):
+    parameters = list(inspect.signature(function).parameters.values())[1:]
+    return all(parameter.default is not parameter.empty for parameter in parameters)
+
+
+def _plan(serializer):
+    # an expanded relation keeps its name but changes its field
+    key = (type(serializer), tuple((name, type(field)) for name, field in serializer.fields.items()))
+    plan = _plans.get(key)
+    if plan is None:
+        model = serializer.Meta.model
+        plan = _plans[key] = tuple(
+            (name, *_plan_field(model, field))
+            for name, field in serializer.fields.items()
+            if not field.write_only
+        )
+    return plan
+
+
+def _generic(field):
+    get_attribute, to_representation = field.get_attribute, field.to_representation
+
+    def get(instance):
+        try:
+            attribute = get_attribute(instance)
+        except SkipField:
+            return _SKIP
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else to_representation(attribute)
+    return get
+
+
+def _attribute(field, getter):
+    convert = _CONVERTERS.get(type(field))
+    if convert is None and type(field) is serializers.UUIDField and field.uuid_format == 'hex_verbose':
+        convert = str
+    if convert is None and type(field) is serializers.ReadOnlyField:
+        convert = _identity
+    if convert is None:
+        convert = field.to_representation
+    fallback = _generic(field)
+
+    def get(instance):
+        try:
+            value = getter(instance)
+        except (AttributeError, ObjectDoesNotExist):
+            # missing relation, default or allow_null: let the field decide
+            return fallback(instance)
+        return None if value is None else convert(value)
+    return get
+
+
+def _identity(value):
+    return value
+
+
+def _call(field, getter):
+    fallback = _generic(field)
+
+    def get(instance):
+        try:
+            value = getter(instance)()
+        except (AttributeError, ObjectDoesNotExist):
+            return fallback(instance)
+        return None if value is None else field.to_representation(value)
+    return get
+
+
+def _nested(field, getter, many):
+    row = compile_serializer(field.child if many else field)
+    fallback = _generic(field)
+
+    def get(instance):
+        try:
+            value = getter(instance)
+        except (AttributeError, ObjectDoesNotExist):
+            return fallback(instance)
+        if value is None:
+            return None
+        if not many:
+            return row(value)
+        if isinstance(value, models.manager.BaseManager):
+            value = value.all()
+        return [row(item) for item in value]
+    return get
+
+
+def compile_serializer(serializer):
+    """
+    Return ``row(instance) -> dict`` producing the same output as
+    ``serializer.to_representation(instance)`` from flat accessors. The
+    field plan is computed once per serializer class; binding it to the
+    fields of ``serializer`` is a per-call, not per-instance, cost.
+    """
+    accessors = []
+    for name, kind, getter in _plan(serializer):
+        field = serializer.fields[name]
+        if kind == 'method':
+            accessor = getattr(field.parent, field.method_name)
+        elif kind == 'pk':
+            accessor = getter
+        elif kind == 'attribute':
+            accessor = _attribute(field, getter)
+        elif kind == 'call':
+            accessor = _call(field, getter)
+        elif kind in ('many', 'one'):
+            accessor = _nested(field, getter, kind == 'many')
+        else:
+            accessor = _generic(field)
+        accessors.append((name, accessor))
+
+    def row(instance):
+        ret = {}
+        for name, accessor in accessors:
+            value = accessor(instance)
+            if value is not _SKIP:
+                ret[name] = value
+        return ret
+    return row
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    """
+    Read-only fast path for ``many=True`` model serializers, enabled with
+    ``Meta.list_serializer_class``. Output is identical to the generic
+    path, which is still used while an N+1 detector tracks serializer
+    fields or inside ``generic_serialization()``.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        if detector_active() or getattr(_local, 'disabled', False) or not can_compile(self.child):
+            return super().to_representation(iterable)
+
+        items = iterable if isinstance(iterable, (list, tuple)) else list(iterable)
+        if items and not isinstance(items[0], self.child.Meta.model):
+            return super().to_representation(items)
+        row = compile_serializer(self.child)
+        return [row(item) for item in items]
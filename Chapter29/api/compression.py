@@ -0,0 +1,162 @@
+import gzip
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    # Python 3.14+
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULTS = {
+    'ENABLED': True,
+    # not worth compressing below this many bytes
+    'MIN_LENGTH': 200,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    'ZSTD_LEVEL': 3,
+}
+
+
+def get_compression_settings():
+    return {**DEFAULTS, **getattr(settings, 'COMPRESSION', {})}
+
+
+def _gzip(data, options):
+    # a fixed mtime keeps the output of equal bodies identical
+    return gzip.compress(data, compresslevel=options['GZIP_LEVEL'], mtime=0)
+
+
+def _brotli(data, options):
+    return brotli.compress(data, quality=options['BROTLI_QUALITY'])
+
+
+def _zstd(data, options):
+    if zstd is not None:
+        return zstd.compress(data, level=options['ZSTD_LEVEL'])
+    return zstandard.ZstdCompressor(level=options['ZSTD_LEVEL']).compress(data)
+
+
+# content codings we can produce, preferred first when the client is indifferent
+ENCODERS = {}
+if zstd is not None or zstandard is not None:
+    ENCODERS['zstd'] = _zstd
+if brotli is not None:
+    ENCODERS['br'] = _brotli
+ENCODERS['gzip'] = _gzip
+
+
+def choose_encoding(accept_encoding):
+    """
+    The content coding to use for an ``Accept-Encoding`` header value, or
+    None: the available coding with the highest q-value, ties going to the
+    most compact one.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in ENCODERS:
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(request, response):
+    """Compress the body of a rendered ``response`` if the client accepts it."""
+    options = get_compression_settings()
+    if (
+        response.streaming
+        or response.has_header('Content-Encoding')
+        or len(response.content) < options['MIN_LENGTH']
+    ):
+        return response
+
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if encoding is None:
+        return response
+    compressed = ENCODERS[encoding](response.content, options)
+    if len(compressed) >= len(response.content):
+        return response
+
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = encoding
+    # as GZipMiddleware does: a strong ETag names the identity body
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    return response
+
+
+def prepare_compression(request, response):
+    """
+    Mark ``response`` as varying on Accept-Encoding and compress it once it
+    is rendered, or now if it already is.
+    """
+    if not get_compression_settings()['ENABLED'] or response.streaming:
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if getattr(response, '_compression_prepared', False):
+        return response
+    response._compression_prepared = True
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.add_post_render_callback(lambda rendered: compress(request, rendered))
+        return response
+    return compress(request, response)
+
+
+def compress_page(view_func):
+    """
+    Compress the responses of ``view_func``. Put it under
+    ``api.responsecache.cache_response`` (and any ``vary_on_headers``): the
+    Vary header it adds is then part of the cache key and the cache stores
+    the compressed body, so a hit skips rendering and compression::
+
+        @method_decorator(cache_response(60 * 15, key_prefix='product_list'))
+        @method_decorator(vary_on_headers('Accept'))
+        @method_decorator(compress_page)
+        def list(self, request, *args, **kwargs):
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return prepare_compression(request, view_func(request, *args, **kwargs))
+    return wrapper
+
+
+class CompressionMixin:
+    """
+    Compress every response of an API view according to Accept-Encoding
+    (zstd and brotli when their modules are installed, gzip always).
+    Configured with ``settings.COMPRESSION``.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return prepare_compression(request, response)
@@ -0,0 +1,111 @@
+import hashlib
+import time
+from functools import wraps
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+
+def _generation_key(model):
+    return f'api.generation.{model._meta.label_lower}'
+
+
+def bump_generation(*models):
+    """Record that rows of ``models`` changed just now."""
+    now = time.time()
+    cache.set_many({_generation_key(model): now for model in models}, timeout=None)
+
+
+def get_generation(model):
+    """
+    Unix time of the last change to ``model`` seen by ``bump_generation``.
+    A cold cache is seeded from ``max(updated_at)``, one indexed query, or
+    with the current time for a model without ``updated_at``.
+    """
+    key = _generation_key(model)
+    generation = cache.get(key)
+    if generation is None:
+        try:
+            model._meta.get_field('updated_at')
+        except FieldDoesNotExist:
+            # nothing tells when it last changed: assume it just did
+            generation = time.time()
+        else:
+            latest = model._default_manager.aggregate(latest=Max('updated_at'))['latest']
+            generation = latest.timestamp() if latest is not None else 0.0
+        cache.add(key, generation, timeout=None)
+    return generation
+
+
+def get_generations(*models):
+    """``get_generation`` of each of ``models``, read with one cache round trip."""
+    keys = {_generation_key(model): model for model in models}
+    found = cache.get_many(list(keys))
+    return [found[key] if key in found else get_generation(model) for key, model in keys.items()]
+
+
+def request_generations(request, *models):
+    """
+    ``get_generations`` of ``models`` read once per request: the ETag, the
+    Last-Modified and the response cache key of a list all use them.
+    """
+    if not hasattr(request, '_generations'):
+        request._generations = {}
+    known = request._generations
+    missing = [model for model in models if model not in known]
+    if missing:
+        known.update(zip(missing, get_generations(*missing)))
+    return [known[model] for model in models]
+
+
+def _etag(*parts):
+    return '"%s"' % hashlib.md5('|'.join(map(str, parts)).encode(), usedforsecurity=False).hexdigest()
+
+
+def _representation(request):
+    # the same data renders differently per Accept (JSON, MessagePack, ...)
+    return request.META.get('HTTP_ACCEPT', '')
+
+
+def representation_etag(request, data):
+    """An ETag for the representation ``data`` of an object, from its content."""
+    return _etag(repr(data), _representation(request))
+
+
+def conditional_list(model, *depends_on, per_user=True):
+    """
+    ``condition`` for a list view of ``model`` whose rows also show data of
+    ``depends_on``. The validators come from the generations of those
+    models, so a request with a current ``If-None-Match`` or
+    ``If-Modified-Since`` gets a 304 without the list being queried. Set
+    ``per_user=False`` when the list is the same for every user.
+    """
+    models = (model, *depends_on)
+
+    def last_modified(request, *args, **kwargs):
+        generation = max(request_generations(request, *models))
+        return datetime.fromtimestamp(generation, tz=timezone.utc) if generation else None
+
+    def etag(request, *args, **kwargs):
+        generations = request_generations(request, *models)
+        # filters, and for per user lists the user, narrow the list
+        user = request.user.pk if per_user else None
+        return _etag(*generations, request.get_full_path(), user, _representation(request))
+
+    def decorator(view_func):
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # a body from the response cache may be compressed already: the ETag
+            # set above names the identity body, as compress() handles otherwise
+            etag = response.get('ETag')
+            if response.has_header('Content-Encoding') and etag and etag.startswith('"'):
+                response['ETag'] = 'W/' + etag
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,106 @@
+from functools import lru_cache
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+from api.prefetch import instantiate, only_columns
+from api.serializers import expandable_serializer
+
+
+def _expandable(serializer_class):
+    return getattr(getattr(serializer_class, 'Meta', None), 'expandable', {})
+
+
+@lru_cache(maxsize=None)
+def field_names(serializer_class):
+    """The names of the fields ``serializer_class`` renders, expanded or not, in order."""
+    serializer = instantiate(serializer_class, expand=tuple(_expandable(serializer_class)))
+    return tuple(name for name, field in serializer.fields.items() if not field.write_only)
+
+
+def _names(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def select_fields(serializer_class, fields=None, omit=None):
+    """
+    The names of the fields of ``serializer_class`` to render, in declared
+    order, keeping ``fields`` (all by default) minus ``omit``; None when
+    that is every field. Unknown names are a ``ValidationError``.
+    """
+    names = field_names(serializer_class)
+    for param, requested in (('fields', fields), ('omit', omit)):
+        unknown = [name for name in requested or () if name not in names]
+        if unknown:
+            raise ValidationError({param: [f"Unknown field(s): {', '.join(unknown)}."]})
+
+    if fields is None and not omit:
+        return None
+    keep = set(names if fields is None else fields).difference(omit or ())
+    return tuple(name for name in names if name in keep)
+
+
+def select_expansion(serializer_class, expand=None):
+    """
+    The relations of ``serializer_class`` to expand as sorted dotted paths,
+    each with the paths it goes through (``items.product`` brings
+    ``items``); None for none. Unknown paths are a ``ValidationError``.
+    """
+    paths, unknown = set(), []
+    for path in expand or ():
+        current = serializer_class
+        names = path.split('.')
+        for depth, name in enumerate(names):
+            spec = _expandable(current).get(name)
+            if spec is None:
+                unknown.append(path)
+                break
+            paths.add('.'.join(names[:depth + 1]))
+            current = expandable_serializer(spec[0])
+    if unknown:
+        raise ValidationError({'expand': [f"Unknown relation(s): {', '.join(unknown)}."]})
+    return tuple(sorted(paths)) or None
+
+
+class SparseFieldsetMixin:
+    """
+    Generic view mixin for ``?fields=a,b`` (render only these) and
+    ``?omit=c`` (render all but these) on reads. The serializer must use
+    ``SparseFieldsMixin``. The SQL is narrowed too: ``.only()`` the columns
+    the selected fields read, and the ``AutoPrefetchMixin`` /
+    ``ValuesListMixin`` lookups of left out fields are skipped, so a client
+    asking for order ids and statuses does not pay for line items.
+
+    With an ``ExpandableFieldsMixin`` serializer, ``?expand=items,user``
+    nests those relations, which are otherwise shallow, and only then are
+    they fetched.
+    """
+    selected_fields = None
+    expanded = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # writes validate every field and must save whole rows
+        if request.method in SAFE_METHODS:
+            serializer_class = self.get_serializer_class()
+            self.selected_fields = select_fields(
+                serializer_class, _names(request, 'fields'), _names(request, 'omit')
+            )
+            self.expanded = select_expansion(serializer_class, _names(request, 'expand'))
+
+    def get_serializer(self, *args, **kwargs):
+        if self.selected_fields is not None:
+            kwargs.setdefault('fields', self.selected_fields)
+        if self.expanded is not None:
+            kwargs.setdefault('expand', self.expanded)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.selected_fields is None:
+            return queryset
+        columns = only_columns(self.get_serializer_class(), queryset.model, self.selected_fields, self.expanded)
+        return queryset if columns is None else queryset.only(*columns)
@@ -1,8 +1,64 @@
+from datetime import datetime, time, timedelta
+
 import django_filters
+from django.utils import timezone
+from django_filters.constants import EMPTY_VALUES
 from api.models import Product, Order
 from rest_framework import filters
 
 
+def day_bounds(day):
+    """
+    Return the half-open ``[start, end)`` timestamps covering ``day``
+    in the current (request) timezone.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+class DayFilter(django_filters.DateFilter):
+    """
+    Match rows whose timestamp falls on the given day.
+
+    Unlike ``field_name='created_at__date'`` this compiles to
+    ``created_at >= day_start AND created_at < next_day_start``, so the
+    database can use an index on the column instead of applying a date
+    function to every row.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        if self.distinct:
+            qs = qs.distinct()
+        start, end = day_bounds(value)
+        return self.get_method(qs)(**{
+            f'{self.field_name}__gte': start,
+            f'{self.field_name}__lt': end,
+        })
+
+
+class DayRangeFilter(django_filters.DateFromToRangeFilter):
+    """
+    Inclusive range of days (``<name>_after`` / ``<name>_before``),
+    compiled into a single half-open timestamp range.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        if self.distinct:
+            qs = qs.distinct()
+        lookups = {}
+        if value.start is not None:
+            lookups[f'{self.field_name}__gte'] = day_bounds(value.start.date())[0]
+        if value.stop is not None:
+            lookups[f'{self.field_name}__lt'] = day_bounds(value.stop.date())[1]
+        return self.get_method(qs)(**lookups)
+
+
 class InStockFilterBackend(filters.BaseFilterBackend):
     def filter_queryset(self, request, queryset, view):
         return queryset.filter(stock__gt=0)
@@ -17,10 +73,11 @@ class ProductFilter(django_filters.FilterSet):
         }
 
 class OrderFilter(django_filters.FilterSet):
-    created_at = django_filters.DateFilter(field_name='created_at__date')
+    created_at = DayFilter(field_name='created_at')
+    created_at_range = DayRangeFilter(field_name='created_at')
     class Meta:
         model = Order
         fields = {
             'status': ['exact'],
             'created_at': ['lt', 'gt', 'exact']
-        }
\ No newline at end of file
+        }
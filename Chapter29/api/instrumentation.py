@@ -0,0 +1,114 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from api.responsecache import served_from_cache
+
+
+class ServerTiming:
+    """
+    Phase durations of one request, rendered as a ``Server-Timing`` header.
+
+    ``db`` is the time spent in SQL over the whole request, so it overlaps
+    with ``auth``; ``serialize`` is the handler time minus the SQL it ran.
+    """
+    __slots__ = ('phases', 'sql_time', 'handler_started', 'handler_sql_time')
+
+    def __init__(self):
+        self.phases = {}
+        self.sql_time = 0.0
+        self.handler_started = None
+        self.handler_sql_time = 0.0
+
+    def record_sql(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def start_handler(self):
+        self.handler_started = time.perf_counter()
+        self.handler_sql_time = self.sql_time
+
+    def finish_handler(self, cache_hit):
+        if self.handler_started is None:
+            return
+        elapsed = time.perf_counter() - self.handler_started
+        if cache_hit:
+            self.add('cache', elapsed)
+        else:
+            self.add('serialize', max(elapsed - (self.sql_time - self.handler_sql_time), 0.0))
+        self.handler_started = None
+
+    def header(self):
+        phases = {**self.phases, 'db': self.sql_time}
+        return ', '.join(f'{name};dur={seconds * 1000:.3f}' for name, seconds in phases.items())
+
+
+class ServerTimingMixin:
+    """
+    Add a ``Server-Timing`` header (auth, throttle, db, serialize, render,
+    cache) to every response of an API view when ``settings.SERVER_TIMING``
+    is on. When it is off the only cost is a settings lookup per request
+    and an attribute check per hook.
+    """
+    server_timing = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not settings.SERVER_TIMING:
+            return super().dispatch(request, *args, **kwargs)
+
+        self.server_timing = timing = ServerTiming()
+        with connection.execute_wrapper(timing.record_sql):
+            response = super().dispatch(request, *args, **kwargs)
+        response['Server-Timing'] = timing.header()
+        return response
+
+    def perform_authentication(self, request):
+        if self.server_timing is None:
+            return super().perform_authentication(request)
+        with self.server_timing.measure('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        if self.server_timing is None:
+            return super().check_permissions(request)
+        with self.server_timing.measure('auth'):
+            super().check_permissions(request)
+
+    def check_throttles(self, request):
+        if self.server_timing is None:
+            return super().check_throttles(request)
+        with self.server_timing.measure('throttle'):
+            super().check_throttles(request)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.server_timing is not None:
+            self.server_timing.start_handler()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        timing = self.server_timing
+        if timing is None:
+            return super().finalize_response(request, response, *args, **kwargs)
+
+        timing.finish_handler(cache_hit=served_from_cache(request))
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            with timing.measure('render'):
+                response.render()
+        return response
@@ -0,0 +1,70 @@
+import time
+from io import BytesIO, StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from api.benchmarks import benchmark_database
+from api.models import Order
+from api.parsers import FastJSONParser
+from api.projection import get_projection
+from api.renderers import FastJSONRenderer
+from api.serializers import OrderSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compares the stdlib and orjson renderer and parser on a large order list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10_000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per renderer and parser; the best one is reported')
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError('orjson is not installed, both paths would use the stdlib')
+
+        with benchmark_database():
+            call_command(
+                'populate_db', products=200, orders=options['orders'],
+                items_per_order=options['items_per_order'], seed=1, stdout=StringIO()
+            )
+            # the order list payload, with total_price as a Decimal
+            projection = get_projection(OrderSerializer, Order)
+            data = projection.render(projection.values(Order.objects.all()), OrderSerializer())
+            # and raw model values: UUIDs, datetimes and Decimals
+            raw = list(Order.objects.values('order_id', 'created_at', 'status', 'items__product__price'))
+
+        repeat = options['repeat']
+        rows = []
+        for name, payload in (('order list', data), ('raw values', raw)):
+            std_ms, expected = self.best_of(lambda: JSONRenderer().render(payload), repeat)
+            fast_ms, content = self.best_of(lambda: FastJSONRenderer().render(payload), repeat)
+            if content != expected:
+                raise CommandError(f'{name}: orjson output differs from JSONRenderer')
+            rows.append((f'render {name}', len(content), std_ms, fast_ms))
+
+        std_ms, expected = self.best_of(lambda: JSONParser().parse(BytesIO(content)), repeat)
+        fast_ms, parsed = self.best_of(lambda: FastJSONParser().parse(BytesIO(content)), repeat)
+        if parsed != expected:
+            raise CommandError('orjson parsed data differs from JSONParser')
+        rows.append(('parse raw values', len(content), std_ms, fast_ms))
+
+        self.stdout.write(f"{'':<20} {'MB':>6} {'stdlib ms':>10} {'orjson ms':>10} {'speedup':>8}")
+        for label, size, std_ms, fast_ms in rows:
+            self.stdout.write(
+                f'{label:<20} {size / 2**20:>6.1f} {std_ms:>10.1f} {fast_ms:>10.1f} {std_ms / fast_ms:>7.1f}x'
+            )
+
+    def best_of(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
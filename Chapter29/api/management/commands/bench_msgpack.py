@@ -0,0 +1,79 @@
+import time
+from io import BytesIO, StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api import renderers
+from api.benchmarks import benchmark_database
+from api.models import Order, Product
+from api.parsers import FastJSONParser, MessagePackParser
+from api.projection import get_projection
+from api.renderers import FastJSONRenderer, MessagePackRenderer
+from api.serializers import OrderSerializer, ProductSerializer
+
+LISTS = {
+    'order_list': (OrderSerializer, Order),
+    'product_list': (ProductSerializer, Product),
+}
+
+
+def serialize(serializer_class, model, renderer):
+    """The list payload as the view builds it when ``renderer`` was negotiated."""
+    request = Request(APIRequestFactory().get('/'))
+    request.accepted_renderer = renderer
+    projection = get_projection(serializer_class, model)
+    serializer = serializer_class(context={'request': request})
+    return projection.render(projection.values(model.objects.all()), serializer)
+
+
+class Command(BaseCommand):
+    help = 'Compares payload size and encode/decode time of JSON and MessagePack list responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000)
+        parser.add_argument('--orders', type=int, default=10_000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per format; the best one is reported')
+
+    def handle(self, *args, **options):
+        if renderers.msgpack is None:
+            raise CommandError('msgpack is not installed')
+
+        formats = {
+            'json': (FastJSONRenderer(), FastJSONParser()),
+            'msgpack': (MessagePackRenderer(), MessagePackParser()),
+        }
+        with benchmark_database():
+            call_command(
+                'populate_db', products=options['products'], orders=options['orders'],
+                items_per_order=options['items_per_order'], seed=1, stdout=StringIO()
+            )
+            payloads = {
+                (name, fmt): serialize(serializer_class, model, renderer)
+                for name, (serializer_class, model) in LISTS.items()
+                for fmt, (renderer, parser) in formats.items()
+            }
+
+        self.stdout.write(f"{'list':<13} {'format':<8} {'KB':>8} {'encode ms':>10} {'decode ms':>10}")
+        for (name, fmt), data in payloads.items():
+            renderer, parser = formats[fmt]
+            encode_ms, content = self.best_of(lambda: renderer.render(data), options['repeat'])
+            decode_ms, decoded = self.best_of(lambda: parser.parse(BytesIO(content)), options['repeat'])
+            if fmt == 'msgpack' and decoded != data:
+                raise CommandError(f'{name}: MessagePack did not round-trip')
+            self.stdout.write(
+                f'{name:<13} {fmt:<8} {len(content) / 1024:>8.0f} {encode_ms:>10.1f} {decode_ms:>10.1f}'
+            )
+
+    def best_of(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
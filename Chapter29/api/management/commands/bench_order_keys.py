@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from api.uuids import uuid7
+
+KEY_FUNCTIONS = {
+    'uuid4': uuid.uuid4,
+    'uuid7': uuid7,
+}
+
+# Mirrors the tables Django creates for Order and OrderItem on SQLite,
+# where a UUIDField is stored as char(32), with their indexes.
+SCHEMA = """
+CREATE TABLE api_order (
+    order_id char(32) NOT NULL PRIMARY KEY,
+    user_id bigint NOT NULL,
+    created_at datetime NOT NULL,
+    updated_at datetime NOT NULL,
+    status varchar(10) NOT NULL
+);
+CREATE INDEX api_order_user_id ON api_order (user_id);
+CREATE INDEX api_order_created_at ON api_order (created_at);
+CREATE INDEX api_order_updated_at ON api_order (updated_at);
+CREATE INDEX api_order_user_id_created_at ON api_order (user_id, created_at);
+CREATE INDEX api_order_user_id_updated_at ON api_order (user_id, updated_at);
+CREATE TABLE api_orderitem (
+    id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+    order_id char(32) NOT NULL,
+    product_id bigint NOT NULL,
+    quantity integer unsigned NOT NULL
+);
+CREATE INDEX api_orderitem_order_id ON api_orderitem (order_id);
+CREATE INDEX api_orderitem_product_id ON api_orderitem (product_id);
+"""
+
+
+class Command(BaseCommand):
+    help = 'Compares insert throughput and index size of uuid4 and uuid7 order keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000,
+                            help='Number of orders to insert per key type')
+        parser.add_argument('--batch-size', type=int, default=10_000,
+                            help='Rows inserted per transaction')
+        parser.add_argument('--items-per-order', type=int, default=0,
+                            help='Also insert this many order items per order')
+        parser.add_argument('--keys', nargs='+', choices=sorted(KEY_FUNCTIONS), default=sorted(KEY_FUNCTIONS))
+
+    def handle(self, *args, **options):
+        results = [self.run(name, options) for name in options['keys']]
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'key':<6} {'rows':>12} {'rows/s':>12} {'pk index MB':>12} {'order indexes MB':>17} "
+            f"{'item index MB':>14} {'file MB':>10}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r['key']:<6} {r['rows']:>12,} {r['rows_per_second']:>12,.0f} "
+                f"{r['pk_index_bytes'] / 2**20:>12.1f} {r['order_indexes_bytes'] / 2**20:>17.1f} "
+                f"{r['item_index_bytes'] / 2**20:>14.1f} {r['file_bytes'] / 2**20:>10.1f}"
+            )
+
+    def run(self, name, options):
+        new_key = KEY_FUNCTIONS[name]
+        rows, batch_size = options['rows'], options['batch_size']
+        items_per_order = options['items_per_order']
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, f'{name}.sqlite3')
+            db = sqlite3.connect(path)
+            db.executescript(SCHEMA)
+
+            started = time.perf_counter()
+            inserted = 0
+            while inserted < rows:
+                count = min(batch_size, rows - inserted)
+                keys = [new_key().hex for _ in range(count)]
+                with db:
+                    db.executemany(
+                        "INSERT INTO api_order VALUES (?, 1, datetime('now'), datetime('now'), 'Pending')",
+                        ((key,) for key in keys)
+                    )
+                    if items_per_order:
+                        db.executemany(
+                            'INSERT INTO api_orderitem (order_id, product_id, quantity) VALUES (?, 1, 1)',
+                            ((key,) for key in keys for _ in range(items_per_order))
+                        )
+                inserted += count
+                if inserted % (batch_size * 100) == 0 or inserted == rows:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f'{name}: {inserted:,} rows, {inserted / elapsed:,.0f} rows/s')
+            elapsed = time.perf_counter() - started
+
+            sizes = dict(db.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name'))
+            db.close()
+            return {
+                'key': name,
+                'rows': rows,
+                'rows_per_second': rows / elapsed,
+                'pk_index_bytes': sizes.get('sqlite_autoindex_api_order_1', 0),
+                # the secondary indexes of api_order
+                'order_indexes_bytes': sum(size for index, size in sizes.items() if index.startswith('api_order_')),
+                'item_index_bytes': sizes.get('api_orderitem_order_id', 0),
+                'file_bytes': os.path.getsize(path),
+            }
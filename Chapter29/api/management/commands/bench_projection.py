@@ -0,0 +1,94 @@
+import time
+import tracemalloc
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import benchmark_database
+from api.models import Order, Product, User
+from api.prefetch import prefetch_queryset
+from api.projection import get_projection
+from api.serializers import OrderSerializer, ProductSerializer, UserSerializer
+
+# the list endpoints using ValuesListMixin
+LISTS = {
+    'product_list': (ProductSerializer, Product),
+    'user_list': (UserSerializer, User),
+    'order_list': (OrderSerializer, Order),
+}
+
+
+def serialize_instances(serializer_class, model):
+    return serializer_class(prefetch_queryset(model.objects.all(), serializer_class), many=True).data
+
+
+def serialize_values(serializer_class, model):
+    projection = get_projection(serializer_class, model)
+    return projection.render(projection.values(model.objects.all()), serializer_class())
+
+
+class Command(BaseCommand):
+    help = 'Compares CPU time and peak memory of model instance and values() list serialization'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10_000)
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--orders', type=int, default=10_000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per list and path; the best one is reported')
+        parser.add_argument('--list', action='append', dest='lists', choices=sorted(LISTS),
+                            help='Only run the named list (repeatable)')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            call_command(
+                'populate_db', products=options['products'], users=options['users'],
+                orders=options['orders'], items_per_order=options['items_per_order'],
+                seed=1, stdout=StringIO()
+            )
+            results = [
+                self.run(name, options['repeat'])
+                for name in LISTS
+                if not options['lists'] or name in options['lists']
+            ]
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'list':<13} {'rows':>7} {'instances ms':>13} {'values ms':>10} "
+            f"{'instances MB':>13} {'values MB':>10}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r['name']:<13} {r['rows']:>7,} {r['instances_ms']:>13.1f} {r['values_ms']:>10.1f} "
+                f"{r['instances_peak'] / 2**20:>13.1f} {r['values_peak'] / 2**20:>10.1f}"
+            )
+
+    def run(self, name, repeat):
+        serializer_class, model = LISTS[name]
+        results = {'name': name}
+        outputs = {}
+        for path, serialize in (('instances', serialize_instances), ('values', serialize_values)):
+            # the queries are part of what is measured: that is where the
+            # model instances get built
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                outputs[path] = serialize(serializer_class, model)
+                elapsed = (time.perf_counter() - started) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            results[f'{path}_ms'] = best
+
+            tracemalloc.start()
+            try:
+                serialize(serializer_class, model)
+                results[f'{path}_peak'] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        if outputs['instances'] != outputs['values']:
+            raise CommandError(f'{name}: values() output differs from the serializer')
+        results['rows'] = len(outputs['values'])
+        self.stdout.write(f"{name}: {results['instances_ms']:.1f}ms instances, {results['values_ms']:.1f}ms values")
+        return results
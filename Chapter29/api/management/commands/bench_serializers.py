@@ -0,0 +1,76 @@
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import benchmark_database
+from api.compiled import generic_serialization
+from api.models import Order, OrderItem, Product
+from api.prefetch import prefetch_queryset
+from api.serializers import OrderItemSerializer, OrderSerializer, ProductSerializer
+
+SERIALIZERS = {
+    'product': (ProductSerializer, Product),
+    'order_item': (OrderItemSerializer, OrderItem),
+    'order': (OrderSerializer, Order),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compares the compiled list serializers with the generic DRF path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10_000)
+        parser.add_argument('--orders', type=int, default=10_000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per serializer and path; the best one is reported')
+        parser.add_argument('--serializer', action='append', dest='serializers',
+                            choices=sorted(SERIALIZERS), help='Only run the named serializer (repeatable)')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            call_command(
+                'populate_db', products=options['products'], orders=options['orders'],
+                items_per_order=options['items_per_order'], seed=1, stdout=StringIO()
+            )
+            results = [
+                self.run(name, options['repeat'])
+                for name in SERIALIZERS
+                if not options['serializers'] or name in options['serializers']
+            ]
+
+        self.stdout.write('')
+        self.stdout.write(f"{'serializer':<12} {'rows':>8} {'generic ms':>11} {'compiled ms':>12} {'speedup':>8}")
+        for r in results:
+            self.stdout.write(
+                f"{r['name']:<12} {r['rows']:>8,} {r['generic_ms']:>11.1f} "
+                f"{r['compiled_ms']:>12.1f} {r['generic_ms'] / r['compiled_ms']:>7.1f}x"
+            )
+
+    def run(self, name, repeat):
+        serializer_class, model = SERIALIZERS[name]
+        # load everything up front: only serialization is timed
+        instances = list(prefetch_queryset(model.objects.all(), serializer_class))
+
+        def serialize():
+            return serializer_class(instances, many=True).data
+
+        with generic_serialization():
+            generic_ms, expected = self.best_of(serialize, repeat)
+        compiled_ms, data = self.best_of(serialize, repeat)
+        if data != expected:
+            raise CommandError(f'{name}: compiled output differs from the generic serializer')
+
+        self.stdout.write(f'{name}: {generic_ms:.1f}ms generic, {compiled_ms:.1f}ms compiled')
+        return {'name': name, 'rows': len(instances), 'generic_ms': generic_ms, 'compiled_ms': compiled_ms}
+
+    def best_of(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,168 @@
+import json
+import platform
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIClient
+
+from api.benchmarks import benchmark_database, compare_to_baseline, run_concurrently
+from api.models import Order, Product, User
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+def build_endpoints(product_ids, order_ids):
+    """
+    (name, method, path, payload) factories for every endpoint in api/urls.py,
+    each taking the request index so consecutive requests hit different rows.
+    """
+    def order_payload(i):
+        return {
+            'status': 'Pending',
+            'items': [{'product': product_ids[(i + n) % len(product_ids)], 'quantity': 1} for n in range(2)],
+        }
+
+    return {
+        'product_list': lambda i: ('get', '/products/', None),
+        'product_list_filtered': lambda i: (
+            'get', '/products/?price__lt=250&name__icontains=product&ordering=-price&search=lorem', None
+        ),
+        'product_detail': lambda i: ('get', f'/products/{product_ids[i % len(product_ids)]}/', None),
+        'product_info': lambda i: ('get', '/products/info/', None),
+        'order_list': lambda i: ('get', '/orders/', None),
+        'order_create': lambda i: ('post', '/orders/', order_payload(i)),
+        'order_update': lambda i: ('put', f'/orders/{order_ids[i % len(order_ids)]}/', order_payload(i)),
+        'user_list': lambda i: ('get', '/users/', None),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks every API endpoint against a seeded dataset and compares with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only run the named endpoint (repeatable)')
+        parser.add_argument('--use-cache', action='store_true',
+                            help='Keep the configured cache (cache_response and throttling stay active)')
+        parser.add_argument('--output', default='benchmark-results.json')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write the results to --baseline instead of comparing')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed latency/throughput drift against the baseline')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        with benchmark_database(use_cache=options['use_cache']):
+            call_command(
+                'populate_db', products=options['products'], users=options['users'],
+                orders=options['orders'], items_per_order=options['items_per_order'],
+                seed=options['seed'], stdout=StringIO()
+            )
+            results = self.run_endpoints(options)
+
+        report = {
+            'meta': {
+                'dataset': {key: options[key] for key in ('products', 'users', 'orders', 'items_per_order', 'seed')},
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'use_cache': options['use_cache'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'endpoints': results,
+        }
+        Path(options['output']).write_text(json.dumps(report, indent=2))
+        self.print_results(results)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        # an endpoint that lost requests reports the latencies of the rest
+        incomplete = [
+            f"{name}: {r['requests']} of {options['requests']} requests completed"
+            + (f", raised {r['errors']}" if r['errors'] else '')
+            for name, r in results.items() if r['errors'] or r['requests'] < options['requests']
+        ]
+        if incomplete:
+            for line in incomplete:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f'{len(incomplete)} endpoint(s) did not complete')
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2))
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(f'No baseline at {baseline_path}, skipping comparison')
+            return
+
+        baseline = json.loads(baseline_path.read_text())
+        if baseline['meta'].get('dataset') != report['meta']['dataset']:
+            self.stdout.write(self.style.WARNING('Baseline was recorded with a different dataset'))
+        regressions = compare_to_baseline(results, baseline['endpoints'], options['tolerance'])
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+            return
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(regression))
+        if options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} regression(s) against baseline')
+
+    def run_endpoints(self, options):
+        admin = User.objects.get(username='admin')
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        order_ids = list(Order.objects.order_by('pk').values_list('pk', flat=True))
+        endpoints = build_endpoints(product_ids, order_ids)
+
+        unknown = set(options['endpoints'] or ()) - set(endpoints)
+        if unknown:
+            raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}")
+
+        results = {}
+        for name, build in endpoints.items():
+            if options['endpoints'] and name not in options['endpoints']:
+                continue
+
+            def make_request(i, build=build):
+                method, path, payload = build(i)
+                client = APIClient()
+                client.force_authenticate(admin)
+                return getattr(client, method)(path, payload, format='json')
+
+            concurrency = options['concurrency']
+            if build(0)[0] != 'get' and connection.vendor == 'sqlite':
+                # SQLite takes one writer at a time, the others fail with "database is locked"
+                concurrency = 1
+            for i in range(options['warmup']):
+                make_request(i)
+            results[name] = run_concurrently(make_request, options['requests'], concurrency)
+            self.stdout.write(f"{name}: {results[name]['p50_ms']:.2f}ms p50")
+        return results
+
+    def print_results(self, results):
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'endpoint':<24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>9} status / errors"
+        )
+        for name, r in results.items():
+            queries = str(r['queries_max']) if r['queries_min'] == r['queries_max'] \
+                else f"{r['queries_min']}-{r['queries_max']}"
+            self.stdout.write(
+                f"{name:<24} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                f"{r['throughput_rps']:>8.1f} {queries:>9} {r['status_codes']}"
+                + (f" {r['errors']}" if r['errors'] else '')
+            )
@@ -1,39 +1,134 @@
 import random
+import time
 from decimal import Decimal
 
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import lorem_ipsum
 from api.models import User, Product, Order, OrderItem
 
+# name, price, stock
+CATALOG = [
+    ("A Scanner Darkly", Decimal('12.99'), 4),
+    ("Coffee Machine", Decimal('70.99'), 6),
+    ("Velvet Underground & Nico", Decimal('15.99'), 11),
+    ("Enter the Wu-Tang (36 Chambers)", Decimal('17.99'), 2),
+    ("Digital Camera", Decimal('350.99'), 4),
+    ("Watch", Decimal('500.05'), 0),
+]
+
+USERNAME_PREFIX = 'customer'
+
+
 class Command(BaseCommand):
     help = 'Creates application data'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=len(CATALOG),
+                            help='Number of products to create (the first ones come from a fixed catalog)')
+        parser.add_argument('--users', type=int, default=0,
+                            help='Number of customer users to create in addition to the admin')
+        parser.add_argument('--orders', type=int, default=3,
+                            help='Number of orders, spread across the admin and the customers')
+        parser.add_argument('--items-per-order', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Seed for the random generator, for reproducible datasets')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk_create batch / transaction')
+
+    def handle(self, *args, **options):
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+        self.batch_size = options['batch_size']
+
         # get or create superuser
         user = User.objects.filter(username='admin').first()
         if not user:
             user = User.objects.create_superuser(username='admin', password='test')
 
-        # create products - name, desc, price, stock, image
-        products = [
-            Product(name="A Scanner Darkly", description=lorem_ipsum.paragraph(), price=Decimal('12.99'), stock=4),
-            Product(name="Coffee Machine", description=lorem_ipsum.paragraph(), price=Decimal('70.99'), stock=6),
-            Product(name="Velvet Underground & Nico", description=lorem_ipsum.paragraph(), price=Decimal('15.99'), stock=11),
-            Product(name="Enter the Wu-Tang (36 Chambers)", description=lorem_ipsum.paragraph(), price=Decimal('17.99'), stock=2),
-            Product(name="Digital Camera", description=lorem_ipsum.paragraph(), price=Decimal('350.99'), stock=4),
-            Product(name="Watch", description=lorem_ipsum.paragraph(), price=Decimal('500.05'), stock=0),
-        ]
-
-        # create products & re-fetch from DB
-        Product.objects.bulk_create(products)
-        products = Product.objects.all()
-
-
-        # create some dummy orders tied to the superuser
-        for _ in range(3):
-            # create an Order with 2 order items
-            order = Order.objects.create(user=user)
-            for product in random.sample(list(products), 2):
-                OrderItem.objects.create(
-                    order=order, product=product, quantity=random.randint(1,3)
-                )
\ No newline at end of file
+        self.create_products(options['products'])
+        self.create_users(options['users'])
+
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        user_ids = [user.pk] + list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        self.create_orders(options['orders'], options['items_per_order'], user_ids, product_ids)
+
+    def create_products(self, total):
+        # a small pool of descriptions keeps generation cheap for large catalogs
+        descriptions = [lorem_ipsum.paragraph() for _ in range(50)]
+
+        def build(start, count):
+            products = []
+            for i in range(start, start + count):
+                if i < len(CATALOG):
+                    name, price, stock = CATALOG[i]
+                else:
+                    name = f"Product {i + 1:07d}"
+                    price = Decimal(random.randint(100, 50000)) / 100
+                    stock = random.randint(0, 50)
+                products.append(Product(
+                    name=name, description=random.choice(descriptions), price=price, stock=stock
+                ))
+            Product.objects.bulk_create(products)
+            return len(products)
+
+        self.run_batches('products', total, build)
+
+    def create_users(self, total):
+        # hashing is deliberately slow, so every generated user shares one hash
+        password = make_password('test')
+        start_index = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+
+        def build(start, count):
+            users = [
+                User(username=f"{USERNAME_PREFIX}{start_index + i + 1:07d}", password=password)
+                for i in range(start, start + count)
+            ]
+            User.objects.bulk_create(users)
+            return len(users)
+
+        self.run_batches('users', total, build)
+
+    def create_orders(self, total, items_per_order, user_ids, product_ids):
+        items_per_order = min(items_per_order, len(product_ids))
+
+        def build(start, count):
+            orders = [Order(user_id=random.choice(user_ids)) for _ in range(count)]
+            items = [
+                OrderItem(order_id=order.pk, product_id=product_id, quantity=random.randint(1, 3))
+                for order in orders
+                for product_id in random.sample(product_ids, items_per_order)
+            ]
+            Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create(items)
+            return len(orders) + len(items)
+
+        self.run_batches('orders', total, build)
+
+    def run_batches(self, label, total, build):
+        """
+        Call ``build(start, count)`` for consecutive chunks of ``total``, one
+        transaction per chunk, reporting progress and rows per second.
+        """
+        if total <= 0:
+            return
+
+        started = time.perf_counter()
+        done = rows = 0
+        while done < total:
+            count = min(self.batch_size, total - done)
+            with transaction.atomic():
+                rows += build(done, count)
+            done += count
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{label}: {done:,}/{total:,} ({rows / elapsed:,.0f} rows/s)",
+                ending='\r' if done < total else '\n'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {done:,} {label} ({rows:,} rows) in {time.perf_counter() - started:.1f}s"
+        ))
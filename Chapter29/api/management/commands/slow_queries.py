@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from api.slowqueries import slow_query_log
+
+SORT_KEYS = {
+    'total': 'total_ms',
+    'max': 'max_ms',
+    'count': 'count',
+    'recent': 'last_seen',
+}
+
+
+class Command(BaseCommand):
+    help = 'Shows slow queries recorded by the slow query log, grouped by fingerprint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='total')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--plans', action='store_true', help='Show the captured EXPLAIN output')
+        parser.add_argument('--clear', action='store_true', help='Empty the slow query log')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            slow_query_log.clear()
+            self.stdout.write(self.style.SUCCESS('Slow query log cleared'))
+            return
+
+        entries = sorted(slow_query_log.entries(), key=lambda e: e[SORT_KEYS[options['sort']]], reverse=True)
+        if not entries:
+            self.stdout.write('No slow queries recorded')
+            return
+
+        for entry in entries[:options['limit']]:
+            views = ', '.join(f'{view} ({count})' for view, count in
+                              sorted(entry['views'].items(), key=lambda item: -item[1]))
+            last_seen = datetime.fromtimestamp(entry['last_seen']).isoformat(timespec='seconds')
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{entry['count']:>6}x  total {entry['total_ms']:.1f}ms  "
+                f"avg {entry['total_ms'] / entry['count']:.1f}ms  max {entry['max_ms']:.1f}ms  "
+                f"last {last_seen}"
+            ))
+            self.stdout.write(f"  {entry['fingerprint']}")
+            self.stdout.write(f'  views: {views}')
+            if options['plans'] and entry['plan']:
+                for line in entry['plan'].splitlines():
+                    self.stdout.write(f'    {line}')
+            self.stdout.write('')
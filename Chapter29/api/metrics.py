@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from api.utils import view_label
+
+DEFAULTS = {
+    'ENABLED': True,
+    # directory shared by all worker processes of one deployment; each
+    # process writes its own snapshot there and /metrics/ sums them
+    'MULTIPROCESS_DIR': None,
+    'FLUSH_INTERVAL': 10,
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def get_metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(labels), self._copy(value)] for labels, value in self.values.items()]
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # per-bucket counts (+Inf last), sum
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1]]
+
+    @staticmethod
+    def merge(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+
+class Registry:
+    """
+    In-process metrics. Every metric has its own lock, so recording only
+    contends with other threads updating the same metric.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._flusher = None
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+    # multi-process support
+
+    def write_snapshot(self, directory):
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self, directory, interval):
+        if self._flusher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.write_snapshot(directory)
+
+        self._flusher = threading.Thread(target=run, name='metrics-flusher', daemon=True)
+        self._flusher.start()
+
+    def collect(self, directory=None):
+        """
+        Return ``{name: {labels: value}}`` for this process, plus the
+        snapshots other processes left in ``directory``.
+        """
+        merged = {name: {} for name in self.metrics}
+        snapshots = [self.snapshot()]
+        if directory:
+            own = f'{os.getpid()}.json'
+            for filename in os.listdir(directory):
+                if filename.endswith('.json') and filename != own:
+                    try:
+                        with open(os.path.join(directory, filename)) as f:
+                            snapshots.append(json.load(f))
+                    except (OSError, ValueError):
+                        continue
+
+        for snapshot in snapshots:
+            for name, samples in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                values = merged[name]
+                for labels, value in samples:
+                    labels = tuple(labels)
+                    values[labels] = metric.merge(values[labels], value) if labels in values else value
+        return merged
+
+    def expose(self, directory=None):
+        """Render every metric in the Prometheus text format."""
+        lines = []
+        for name, values in self.collect(directory).items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for labels, value in sorted(values.items()):
+                pairs = list(zip(metric.labelnames, labels))
+                if metric.type == 'counter':
+                    lines.append(f'{name}{_format_labels(pairs)} {value}')
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(pairs + [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(pairs)} {total}')
+                lines.append(f'{name}_count{_format_labels(pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'api_request_duration_seconds', 'Request latency by view.', ('view', 'method'))
+requests_total = registry.counter(
+    'api_requests_total', 'Requests by view and status code.', ('view', 'method', 'status'))
+response_size = registry.histogram(
+    'api_response_size_bytes', 'Response body size by view.', ('view',), SIZE_BUCKETS)
+db_queries = registry.histogram(
+    'api_db_queries_per_request', 'SQL queries per request by view.', ('view',), QUERY_COUNT_BUCKETS)
+db_time = registry.counter(
+    'api_db_query_seconds_total', 'Time spent in SQL by view.', ('view',))
+cache_requests = registry.counter(
+    'api_cache_page_requests_total', 'Response cache lookups by key prefix and result.', ('prefix', 'result'))
+negative_cache_saved_queries = registry.counter(
+    'api_negative_cache_saved_queries_total', 'Queries saved by answering 404s from the negative cache.', ('model',))
+throttle_rejections = registry.counter(
+    'api_throttle_rejections_total', 'Requests rejected by throttles, by scope.', ('scope',))
+
+
+class MetricsMiddleware:
+    """
+    Record latency, response size and SQL usage of every request routed to
+    a view into ``registry``. Configured with ``settings.METRICS``.
+    """
+
+    def __init__(self, get_response):
+        options = get_metrics_settings()
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        if options['MULTIPROCESS_DIR']:
+            registry.start_flusher(options['MULTIPROCESS_DIR'], options['FLUSH_INTERVAL'])
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sql = [0, 0.0]
+
+        def record_sql(execute, *args):
+            started = time.perf_counter()
+            try:
+                return execute(*args)
+            finally:
+                sql[0] += 1
+                sql[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(record_sql):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        view = getattr(request, '_metrics_view', None)
+        if view is None:
+            return response
+        request_duration.observe(duration, view=view, method=request.method)
+        requests_total.inc(view=view, method=request.method, status=response.status_code)
+        if not response.streaming:
+            response_size.observe(len(response.content), view=view)
+        db_queries.observe(sql[0], view=view)
+        db_time.inc(sql[1], view=view)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = view_label(view_func, request.method)
+        return None
@@ -0,0 +1,63 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from api.querybudget import QueryBudgetExceeded, get_query_budget
+from api.utils import handler_name, is_explain
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the SQL queries of every request and compare them with the budget
+    declared on the view (see ``api.querybudget``).
+
+    Controlled by ``settings.QUERY_BUDGETS``: ``ENABLED`` (defaults to DEBUG)
+    and ``RAISE``, which turns an overrun into ``QueryBudgetExceeded``
+    instead of a logged warning. Keep it after silk so silk's own writes are
+    not counted; the EXPLAINs it and the slow query log run are skipped.
+    """
+
+    def __init__(self, get_response):
+        options = getattr(settings, 'QUERY_BUDGETS', {})
+        if not options.get('ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.raise_on_overrun = options.get('RAISE', False)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            if not is_explain(sql):
+                queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.get_response(request)
+
+        budget = getattr(request, '_query_budget', None)
+        if budget is not None and len(queries) > budget:
+            self.report(request, budget, queries)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            return None
+        name = handler_name(view_func, request.method)
+        request._query_budget = get_query_budget(view_class, name)
+        request._query_budget_view = f'{view_class.__name__}.{name}'
+        return None
+
+    def report(self, request, budget, queries):
+        message = (
+            f'{request._query_budget_view} ran {len(queries)} queries, '
+            f'budget is {budget} ({request.method} {request.get_full_path()})'
+        )
+        logger.warning('%s:\n%s', message, '\n'.join(queries))
+        if self.raise_on_overrun:
+            raise QueryBudgetExceeded(message)
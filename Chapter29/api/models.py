@@ -1,6 +1,6 @@
-import uuid
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from api.uuids import uuid7
 
 
 class User(AbstractUser):
@@ -13,6 +13,7 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField()
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     @property
     def in_stock(self):
@@ -20,6 +21,15 @@ class Product(models.Model):
     
     def __str__(self):
         return self.name
+
+
+class ProductTombstone(models.Model):
+    """A deleted product, kept so clients can sync the deletion."""
+    product_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Product {self.product_id} deleted at {self.deleted_at}"
     
 
 class Order(models.Model):
@@ -28,9 +38,10 @@ class Order(models.Model):
         CONFIRMED = 'Confirmed'
         CANCELLED = 'Cancelled'
 
-    order_id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    order_id = models.UUIDField(primary_key=True, default=uuid7)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     status = models.CharField(
         max_length=10,
         choices=StatusChoices.choices,
@@ -39,6 +50,12 @@ class Order(models.Model):
 
     products = models.ManyToManyField(Product, through="OrderItem", related_name='orders')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['user', 'updated_at']),
+        ]
+
     def __str__(self):
         return f"Order {self.order_id } by {self.user.username}"
 
@@ -0,0 +1,134 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from api.slowqueries import fingerprint
+from api.utils import is_explain
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'RAISE': False,
+    # how many times the same query may run under one serializer field
+    'THRESHOLD': 2,
+    # queries on these tables are bookkeeping of other tools, not N+1s
+    'IGNORE_TABLES': ['silk_'],
+}
+
+_local = threading.local()
+
+
+def get_nplusone_settings():
+    return {**DEFAULTS, **getattr(settings, 'NPLUSONE', {})}
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class NPlusOneDetector:
+    """
+    Execute wrapper that counts queries by (fingerprint, serializer field).
+    The same query shape running ``threshold`` times while the same field is
+    being serialized means that field loads a relation per instance.
+    """
+
+    def __init__(self, threshold, raise_errors, ignore_tables=()):
+        self.threshold = threshold
+        self.raise_errors = raise_errors
+        self.ignore = tuple(f'"{prefix}' for prefix in ignore_tables)
+        self.field_stack = []
+        self.counts = {}
+        self.reports = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # other tools (silk) EXPLAIN every query they see, those are not N+1s
+        if (
+            self.field_stack
+            and not is_explain(sql)
+            and not any(table in sql for table in self.ignore)
+        ):
+            key = (fingerprint(sql), ' > '.join(self.field_stack))
+            count = self.counts[key] = self.counts.get(key, 0) + 1
+            if count == self.threshold:
+                self.report(*key)
+        return execute(sql, params, many, context)
+
+    def report(self, sql, field):
+        message = (
+            f'N+1 query: {field} ran the same query for {self.threshold} instances. '
+            f'Add a select_related/prefetch_related for it.\n{sql}'
+        )
+        self.reports.append(message)
+        if self.raise_errors:
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+
+def detector_active():
+    return getattr(_local, 'detector', None) is not None
+
+
+@contextmanager
+def detect_n_plus_one(threshold=None, raise_errors=None):
+    """
+    Watch the queries run by serializers using ``TrackFieldsMixin`` inside
+    the block. Defaults come from ``settings.NPLUSONE``.
+    """
+    options = get_nplusone_settings()
+    detector = NPlusOneDetector(
+        options['THRESHOLD'] if threshold is None else threshold,
+        options['RAISE'] if raise_errors is None else raise_errors,
+        options['IGNORE_TABLES'],
+    )
+    previous = getattr(_local, 'detector', None)
+    _local.detector = detector
+    try:
+        with connection.execute_wrapper(detector):
+            yield detector
+    finally:
+        _local.detector = previous
+
+
+class TrackFieldsMixin:
+    """
+    Serializer mixin that tells an active N+1 detector which field is being
+    serialized, so repeated queries can be pinned on it.
+    """
+
+    @property
+    def _readable_fields(self):
+        detector = getattr(_local, 'detector', None)
+        if detector is None:
+            yield from super()._readable_fields
+            return
+
+        stack = detector.field_stack
+        name = type(self).__name__
+        for field in super()._readable_fields:
+            stack.append(f'{name}.{field.field_name}')
+            try:
+                yield field
+            finally:
+                stack.pop()
+
+
+class NPlusOneMiddleware:
+    """
+    Run every request under ``detect_n_plus_one``. Configured with
+    ``settings.NPLUSONE``: log in development, raise in the test suite.
+    """
+
+    def __init__(self, get_response):
+        if not get_nplusone_settings()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with detect_n_plus_one():
+            return self.get_response(request)
@@ -0,0 +1,229 @@
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+
+from api.conditional import representation_etag
+from api.metrics import cache_requests, negative_cache_saved_queries
+from api.renderers import native_types
+from api.utils import is_explain
+
+# as the list response caches
+TIMEOUT = 60 * 15
+# long enough to absorb a bot, short enough that a missed invalidation does not matter
+MISSING_TIMEOUT = 30
+
+
+def object_key(serializer_class, model, pk, native=False):
+    # NativeTypesMixin serializers give MessagePack objects where JSON gets strings
+    representation = 'native' if native else 'json'
+    return f'api.object.{model._meta.label_lower}.{serializer_class.__name__}.{representation}.{pk}'
+
+
+def _prefix(model):
+    return f'{model._meta.model_name}_object'
+
+
+def _add_many(values, timeout):
+    """``cache.add`` each of ``values``, in one round trip on django-redis."""
+    client = getattr(cache, 'client', None)
+    if not hasattr(client, 'get_client'):
+        for key, value in values.items():
+            cache.add(key, value, timeout)
+        return
+    pipeline = client.get_client(write=True).pipeline()
+    for key, value in values.items():
+        pipeline.set(client.make_key(key), client.encode(value), nx=True, ex=timeout)
+    pipeline.execute()
+
+
+def cache_representation(serializer_class, instance, timeout=TIMEOUT):
+    """
+    Write the JSON representation of a saved ``instance`` through to the
+    cache, dropping the native one. Call it once the save has committed,
+    or a request in between caches the old row on top of it.
+    """
+    model = type(instance)
+    cache.set(object_key(serializer_class, model, instance.pk), dict(serializer_class(instance).data), timeout)
+    cache.delete(object_key(serializer_class, model, instance.pk, native=True))
+
+
+def forget_representation(serializer_class, model, pk):
+    cache.delete_many([object_key(serializer_class, model, pk, native) for native in (False, True)])
+
+
+def cached_representations(queryset, serializer_class, ids, context=None, timeout=TIMEOUT):
+    """
+    The representations of the rows of ``queryset`` with primary keys
+    ``ids``, in that order, None for those that do not exist. Cached ones
+    come from one ``get_many``, the rest from one ``pk__in`` query, and
+    those are cached with one ``set_many``.
+    """
+    model = queryset.model
+    context = context or {}
+    native = native_types(context.get('request'))
+    keys = {pk: object_key(serializer_class, model, pk, native) for pk in ids}
+    found = cache.get_many(list(keys.values()))
+    representations = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in keys if pk not in representations]
+    cache_requests.inc(len(representations), prefix=_prefix(model), result='hit')
+    cache_requests.inc(len(missing), prefix=_prefix(model), result='miss')
+
+    if missing:
+        instances = list(queryset.filter(pk__in=missing))
+        data = serializer_class(instances, many=True, context=context).data
+        fetched = {instance.pk: dict(item) for instance, item in zip(instances, data)}
+        # a save since the query wrote a newer representation through: keep it
+        _add_many({keys[pk]: item for pk, item in fetched.items()}, timeout)
+        representations.update(fetched)
+    return [representations.get(pk) for pk in ids]
+
+
+def missing_key(model, pk):
+    try:
+        # /orders/<UUID>/ and /orders/<uuid>/ are the same order
+        pk = model._meta.pk.to_python(pk)
+    except DjangoValidationError:
+        pass
+    return f'api.missing.{model._meta.label_lower}.{pk}'
+
+
+def forget_missing(model, pk):
+    """Drop the negative cache entry of a created object."""
+    cache.delete(missing_key(model, pk))
+
+
+def parse_ids(value, limit, param='ids'):
+    """The integer primary keys in a comma separated ``value``, at most ``limit`` of them."""
+    try:
+        ids = [int(pk) for pk in value.split(',') if pk.strip()]
+    except ValueError:
+        raise ValidationError({param: ['Expected a comma separated list of integers.']})
+    if len(ids) > limit:
+        raise ValidationError({param: [f'At most {limit} ids at a time.']})
+    return ids
+
+
+class CachedObjectMixin:
+    """
+    Generic view mixin that serves ``retrieve`` and ``?ids=3,1,2`` on
+    ``list`` from per-object cached representations, so a client showing
+    a handful of objects makes one request costing one ``get_many`` rather
+    than a request and a query each. A batch lists the objects in the
+    order asked for, null for those that do not exist; other filters do
+    not apply to it.
+
+    ``retrieve`` sets an ETag computed from the representation and answers
+    a matching ``If-None-Match`` with a 304.
+
+    The representations are shared by every client: use it for views
+    without per-user fields or object permissions, and write saves through
+    with ``cache_representation`` (see ``api.signals``).
+    """
+    object_cache_timeout = TIMEOUT
+    max_batch_size = 100
+
+    def get_representations(self, ids):
+        # SparseFieldsetMixin narrows the queryset; cached objects are whole
+        queryset = self.get_queryset().defer(None)
+        data = cached_representations(
+            queryset, self.get_serializer_class(), ids, self.get_serializer_context(), self.object_cache_timeout
+        )
+        fields = getattr(self, 'selected_fields', None)
+        if fields is None:
+            return data
+        return [None if item is None else {name: item[name] for name in fields} for item in data]
+
+    def list(self, request, *args, **kwargs):
+        value = request.query_params.get('ids')
+        if value is None:
+            return super().list(request, *args, **kwargs)
+        return Response(self.get_representations(parse_ids(value, self.max_batch_size)))
+
+    def retrieve(self, request, *args, **kwargs):
+        data, = self.get_representations([self.kwargs[self.lookup_url_kwarg or self.lookup_field]])
+        if data is None:
+            # as get_object_or_404
+            raise Http404(f'No {self.get_queryset().model._meta.object_name} matches the given query.')
+        # validated from the cached representation: a hit is a 304 without a query
+        response = Response(data)
+        response['ETag'] = representation_etag(request, data)
+        return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+class _QueryCounter:
+    __slots__ = ('count',)
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not is_explain(sql):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class NegativeCacheMixin:
+    """
+    Generic view mixin that remembers, for ``negative_cache_timeout``
+    seconds, the primary keys a ``GET`` of one object found no row for, and
+    answers them with a 404 right after authentication, before any query
+    of the handler. Creating the object must ``forget_missing`` it (see
+    ``api.signals``). Each such 404 adds the queries its first lookup ran
+    to ``api_negative_cache_saved_queries_total``.
+
+    Only keys missing from the whole table are remembered: when
+    ``get_queryset()`` is filtered, e.g. to the user's own orders, a 404 is
+    confirmed with one more query before it is cached.
+    """
+    negative_cache_timeout = MISSING_TIMEOUT
+    _lookup_queries = None
+
+    def dispatch(self, request, *args, **kwargs):
+        self._query_counter = _QueryCounter()
+        with connection.execute_wrapper(self._query_counter):
+            return super().dispatch(request, *args, **kwargs)
+
+    def _negative_cache_key(self):
+        pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if pk is None or self.request.method not in ('GET', 'HEAD'):
+            return None
+        return missing_key(self.get_queryset().model, pk)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        key = self._negative_cache_key()
+        if key is None:
+            return
+        model = self.get_queryset().model
+        prefix = f'{model._meta.model_name}_missing'
+        saved = cache.get(key)
+        if saved is not None:
+            cache_requests.inc(prefix=prefix, result='hit')
+            negative_cache_saved_queries.inc(saved, model=model._meta.label_lower)
+            raise Http404(f'No {model._meta.object_name} matches the given query.')
+        cache_requests.inc(prefix=prefix, result='miss')
+        self._lookup_queries = self._query_counter.count
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (Http404, NotFound)) and self._lookup_queries is not None:
+            queries = self._query_counter.count - self._lookup_queries
+            self._lookup_queries = None
+            if self._is_missing():
+                cache.set(self._negative_cache_key(), queries, self.negative_cache_timeout)
+        return super().handle_exception(exc)
+
+    def _is_missing(self):
+        queryset = self.get_queryset()
+        if not queryset.query.has_filters():
+            # the lookup that failed saw the whole table
+            return True
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            return not queryset.model._default_manager.filter(pk=pk).exists()
+        except (DjangoValidationError, TypeError, ValueError):
+            # as get_object_or_404: a malformed key matches nothing
+            return True
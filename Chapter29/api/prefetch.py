@@ -0,0 +1,226 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+class _Node:
+    """Relations reached from ``model``, split by how they are loaded."""
+
+    def __init__(self, model):
+        self.model = model
+        self.select = {}
+        self.prefetch = {}
+
+    def follow(self, attrs):
+        """
+        Walk ``attrs`` (a dotted source or a ``__`` lookup, split) for as
+        long as they are relations and return the node reached, or None when
+        the first attribute already is a plain field, property or method.
+        """
+        node = None
+        current = self
+        for attr in attrs:
+            relation = get_relation(current.model, attr)
+            if relation is None:
+                break
+            children = current.prefetch if relation.many_to_many or relation.one_to_many else current.select
+            if attr not in children:
+                children[attr] = _Node(relation.related_model)
+            node = current = children[attr]
+        return node
+
+    def lookups(self, prefix=''):
+        select, prefetch = [], []
+        for name, child in self.select.items():
+            path = prefix + name
+            child_select, child_prefetch = child.lookups(f'{path}__')
+            # select_related('a__b') already joins 'a'
+            select.extend(child_select or [path])
+            prefetch.extend(child_prefetch)
+        for name, child in self.prefetch.items():
+            child_select, child_prefetch = child.lookups()
+            if not child_select and not child_prefetch:
+                prefetch.append(prefix + name)
+                continue
+            queryset = child.model._default_manager.all()
+            if child_select:
+                queryset = queryset.select_related(*child_select)
+            if child_prefetch:
+                queryset = queryset.prefetch_related(*child_prefetch)
+            prefetch.append(Prefetch(prefix + name, queryset=queryset))
+        return select, prefetch
+
+
+def get_relation(model, attr):
+    """
+    The relation ``attr`` names on ``model``, looked up by accessor name so
+    reverse relations without a ``related_name`` (``orderitem_set``) are
+    found too.
+    """
+    try:
+        field = model._meta.get_field(attr)
+    except FieldDoesNotExist:
+        field = next(
+            (
+                f for f in model._meta.get_fields()
+                if f.auto_created and not f.concrete and f.get_accessor_name() == attr
+            ),
+            None
+        )
+    if field is None or not field.is_relation or field.related_model is None:
+        return None
+    return field
+
+
+def _walk(serializer, node, annotated=()):
+    meta = getattr(serializer, 'Meta', None)
+    hints = getattr(meta, 'related_hints', {})
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+
+        if name not in annotated:
+            for lookup in hints.get(name, ()):
+                node.follow(lookup.split('__'))
+
+        # many=True serializers are bound to the source, their child is not
+        attrs = field.source_attrs
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        if not attrs:
+            # source='*' renders the instance itself
+            if isinstance(field, serializers.BaseSerializer):
+                _walk(field, node)
+            continue
+
+        if isinstance(field, serializers.RelatedField) and field.use_pk_only_optimization():
+            # a primary key field only reads the foreign key column
+            parent = node.follow(attrs[:-1]) if len(attrs) > 1 else node
+            relation = get_relation(parent.model, attrs[-1]) if parent is not None else None
+            if relation is not None and relation.concrete:
+                continue
+        target = node.follow(attrs)
+        if target is not None and isinstance(field, serializers.BaseSerializer):
+            _walk(field, target)
+
+
+def instantiate(serializer_class, fields=None, expand=None):
+    """An unbound ``serializer_class``, narrowed to ``fields`` and with ``expand`` when given."""
+    kwargs = {}
+    if fields is not None:
+        kwargs['fields'] = fields
+    if expand:
+        kwargs['expand'] = expand
+    return serializer_class(**kwargs)
+
+
+def _annotations(serializer):
+    expressions = getattr(getattr(serializer, 'Meta', None), 'values_expressions', {})
+    return {
+        name: expressions[name]
+        for name, field in serializer.fields.items()
+        if name in expressions and isinstance(field, serializers.SerializerMethodField)
+    }
+
+
+@lru_cache(maxsize=None)
+def expression_annotations(serializer_class, fields=None, expand=None):
+    """
+    The ``Meta.values_expressions`` of the method fields rendered, to
+    annotate on the queryset: the method reads the annotation instead of
+    walking relations, whose ``related_hints`` are then not prefetched.
+    """
+    return _annotations(instantiate(serializer_class, fields, expand))
+
+
+@lru_cache(maxsize=None)
+def related_lookups(serializer_class, model, fields=None, expand=None):
+    """
+    Return the ``(select_related, prefetch_related)`` lookups needed to
+    render ``serializer_class`` (or only its ``fields``, with the relations
+    in ``expand`` nested) for instances of ``model`` annotated with
+    ``expression_annotations()``, without running a query per instance.
+
+    Nested serializers, dotted ``source`` paths and related fields are
+    followed through the model graph. Attributes the walk cannot see into,
+    like method fields and properties, declare what they read in
+    ``Meta.related_hints``::
+
+        class Meta:
+            related_hints = {'total_price': ['items__product']}
+    """
+    serializer = instantiate(serializer_class, fields, expand)
+    node = _Node(model)
+    _walk(serializer, node, annotated=_annotations(serializer))
+    select, prefetch = node.lookups()
+    return tuple(select), tuple(prefetch)
+
+
+def prefetch_queryset(queryset, serializer_class, fields=None, expand=None):
+    """``queryset`` with the lookups and annotations ``related_lookups`` describes."""
+    select, prefetch = related_lookups(serializer_class, queryset.model, fields, expand)
+    annotations = expression_annotations(serializer_class, fields, expand)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    return queryset
+
+
+@lru_cache(maxsize=None)
+def only_columns(serializer_class, model, fields=None, expand=None):
+    """
+    The ``only()`` lookups covering what ``serializer_class`` (or only its
+    ``fields``) reads from rows of ``model``, or None when some field may
+    read any column: a property or method with no ``related_hints``.
+    Related rows are loaded by ``related_lookups`` and are not narrowed.
+    """
+    serializer = instantiate(serializer_class, fields, expand)
+    hints = getattr(getattr(serializer, 'Meta', None), 'related_hints', {})
+    annotated = _annotations(serializer)
+    columns = []
+    for name, field in serializer.fields.items():
+        if field.write_only or name in annotated:
+            continue
+        if name in hints:
+            paths = [lookup.split('__') for lookup in hints[name]]
+        elif field.source_attrs:
+            paths = [field.source_attrs]
+        else:
+            return None
+        for attrs in paths:
+            relation = get_relation(model, attrs[0])
+            if relation is None:
+                try:
+                    model._meta.get_field(attrs[0])
+                except FieldDoesNotExist:
+                    return None
+            elif not relation.concrete or relation.many_to_many:
+                # read through a prefetch keyed on the primary key
+                continue
+            columns.append(attrs[0])
+    return tuple(dict.fromkeys(columns))
+
+
+class AutoPrefetchMixin:
+    """
+    Generic view mixin that adds the ``select_related``,
+    ``prefetch_related`` and ``annotate`` calls the serializer of the
+    current action needs to ``get_queryset()``, so queries stay optimal as
+    serializers change.
+    """
+    auto_prefetch = True
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.auto_prefetch:
+            return queryset
+        return prefetch_queryset(
+            queryset, self.get_serializer_class(),
+            getattr(self, 'selected_fields', None), getattr(self, 'expanded', None)
+        )
@@ -0,0 +1,166 @@
+import math
+import random
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from api.utils import view_label
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.01,
+    # (path prefix, sample rate) pairs, first match wins
+    'RULES': [],
+    'BUFFER_SIZE': 10_000,
+    'FLUSH_INTERVAL': 5,
+}
+
+
+def get_profiler_settings():
+    return {**DEFAULTS, **getattr(settings, 'PROFILER', {})}
+
+
+class ViewStats:
+    __slots__ = ('count', 'errors', 'total', 'max', 'sql_count', 'sql_time', 'recent')
+
+    def __init__(self):
+        self.count = self.errors = self.sql_count = 0
+        self.total = self.max = self.sql_time = 0.0
+        self.recent = deque(maxlen=1000)
+
+    def add(self, duration, status_code, sql_count, sql_time):
+        self.count += 1
+        self.errors += status_code >= 500
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.sql_count += sql_count
+        self.sql_time += sql_time
+        self.recent.append(duration)
+
+    def as_dict(self):
+        recent = sorted(self.recent)
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': self.total / self.count * 1000,
+            'p95_ms': recent[max(math.ceil(len(recent) * 0.95), 1) - 1] * 1000,
+            'max_ms': self.max * 1000,
+            'total_ms': self.total * 1000,
+            'avg_queries': self.sql_count / self.count,
+            'avg_sql_ms': self.sql_time / self.count * 1000,
+        }
+
+
+class Profiler:
+    """
+    Collects request samples in a bounded ring buffer and folds them into
+    per-view statistics from a background thread, off the request path.
+
+    When the buffer is full the oldest samples are dropped.
+    """
+
+    def __init__(self, buffer_size=DEFAULTS['BUFFER_SIZE'], flush_interval=DEFAULTS['FLUSH_INTERVAL']):
+        self.buffer = deque(maxlen=buffer_size)
+        self.flush_interval = flush_interval
+        self.stats = {}
+        self.lock = threading.Lock()
+        self._flusher = None
+
+    def record(self, view, duration, status_code, sql_count, sql_time):
+        # deque.append is atomic, no lock needed on the request path
+        self.buffer.append((view, duration, status_code, sql_count, sql_time))
+        if self._flusher is None:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self.lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            while True:
+                try:
+                    view, *sample = self.buffer.popleft()
+                except IndexError:
+                    break
+                stats = self.stats.get(view)
+                if stats is None:
+                    stats = self.stats[view] = ViewStats()
+                stats.add(*sample)
+
+    def snapshot(self):
+        self.flush()
+        with self.lock:
+            return {view: stats.as_dict() for view, stats in self.stats.items()}
+
+    def reset(self):
+        with self.lock:
+            self.buffer.clear()
+            self.stats = {}
+
+
+_options = get_profiler_settings()
+profiler = Profiler(_options['BUFFER_SIZE'], _options['FLUSH_INTERVAL'])
+
+
+class SamplingProfilerMiddleware:
+    """
+    Time a random sample of requests, with their SQL query count and time,
+    and feed them to ``profiler``. Cheap enough to leave on in production,
+    unlike silk which writes every request and query to the database.
+
+    Configured with ``settings.PROFILER`` (see ``DEFAULTS``).
+    """
+
+    def __init__(self, get_response):
+        options = get_profiler_settings()
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.sample_rate = options['SAMPLE_RATE']
+        self.rules = [(prefix, rate) for prefix, rate in options['RULES']]
+        self.get_response = get_response
+
+    def get_sample_rate(self, path):
+        for prefix, rate in self.rules:
+            if path.startswith(prefix):
+                return rate
+        return self.sample_rate
+
+    def __call__(self, request):
+        rate = self.get_sample_rate(request.path_info)
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+
+        sql = [0, 0.0]
+
+        def record_sql(execute, *args):
+            started = time.perf_counter()
+            try:
+                return execute(*args)
+            finally:
+                sql[0] += 1
+                sql[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(record_sql):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        view = getattr(request, '_profiler_view', None) or 'unresolved'
+        profiler.record(view, duration, response.status_code, sql[0], sql[1])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._profiler_view = view_label(view_func, request.method)
+        return None
@@ -0,0 +1,243 @@
+from collections import defaultdict
+from decimal import Decimal
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import DecimalField, F
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from api.prefetch import get_relation, instantiate
+
+# values() alias of the parent key in the rows of a related projection
+PARENT = '_parent'
+
+
+def _link(relation):
+    """Lookup from the related model back to the model declaring ``relation``."""
+    if relation.concrete:
+        # forward many-to-many
+        return relation.related_query_name()
+    return relation.field.name
+
+
+def _quantizer(places):
+    exponent = Decimal(1).scaleb(-places)
+
+    def quantize(value):
+        return value.quantize(exponent)
+    return quantize
+
+
+class Projection:
+    """
+    How to read the fields of a model serializer with ``.values()``: model
+    columns, dotted sources across foreign keys and
+    ``Meta.values_expressions`` come from one query; many-valued relations
+    and nested foreign keys cost one extra query each, however many rows
+    there are.
+
+    Fields the ORM cannot compute, like method fields and properties,
+    must be given an expression::
+
+        class Meta:
+            values_expressions = {'total_price': Sum(...)}
+    """
+
+    def __init__(self, serializer_class, model, fields=None, expand=None):
+        serializer = instantiate(serializer_class, fields, expand)
+        expressions = getattr(serializer.Meta, 'values_expressions', {})
+        self.model = model
+        self.lookups = []
+        self.expressions = {}
+        # (kind, field name, values key or related index) in serializer order
+        self.steps = []
+        # (field name, related model, link back to this model, child projection or None)
+        self.related = []
+        # field name -> (related model, values key, child projection) of nested foreign keys
+        self.joined = {}
+        # field name -> function applied to the computed value first
+        self.prepare = {}
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in expressions:
+                self.expressions[name] = expressions[name]
+                output_field = getattr(expressions[name], '_output_field_or_none', None)
+                if isinstance(output_field, DecimalField) and output_field.decimal_places is not None:
+                    # backends return computed decimals unquantized (29.9700000000000)
+                    self.prepare[name] = _quantizer(output_field.decimal_places)
+                # method fields return the computed value as is
+                kind = 'raw' if isinstance(field, serializers.SerializerMethodField) else 'column'
+                self.steps.append((kind, name, name))
+            else:
+                self.steps.append(self._plan_field(name, field))
+
+    def _plan_field(self, name, field):
+        attrs = field.source_attrs
+        if isinstance(field, (serializers.ManyRelatedField, serializers.ListSerializer)):
+            relation = get_relation(self.model, attrs[0]) if len(attrs) == 1 else None
+            if relation is None or not (relation.many_to_many or relation.one_to_many):
+                raise self._unsupported(name, field)
+            if isinstance(field, serializers.ManyRelatedField):
+                if type(field.child_relation) is not serializers.PrimaryKeyRelatedField:
+                    raise self._unsupported(name, field)
+                child = None
+            else:
+                child = _child_projection(field.child, relation.related_model)
+            self.related.append((name, relation.related_model, _link(relation), child))
+            return 'related', name, len(self.related) - 1
+
+        if isinstance(field, serializers.BaseSerializer) and len(attrs) == 1:
+            relation = get_relation(self.model, attrs[0])
+            if relation is None or not relation.concrete or relation.many_to_many:
+                raise self._unsupported(name, field)
+            # rendered from a second query on the keys in the rows
+            self.lookups.append(attrs[0])
+            self.joined[name] = (relation.related_model, attrs[0], _child_projection(field, relation.related_model))
+            return 'joined', name, attrs[0]
+
+        if not attrs or isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)):
+            raise self._unsupported(name, field)
+        is_pk = isinstance(field, serializers.PrimaryKeyRelatedField)
+        if isinstance(field, serializers.RelatedField) and not (is_pk and field.pk_field is None):
+            raise self._unsupported(name, field)
+
+        current = self.model
+        for position, attr in enumerate(attrs):
+            relation = get_relation(current, attr)
+            last = position == len(attrs) - 1
+            if relation is None:
+                try:
+                    current._meta.get_field(attr)
+                except FieldDoesNotExist:
+                    raise self._unsupported(name, field)
+                if not last:
+                    raise self._unsupported(name, field)
+            elif relation.many_to_many or relation.one_to_many or not relation.concrete:
+                raise self._unsupported(name, field)
+            elif last and not is_pk:
+                # a whole related object cannot come out of values()
+                raise self._unsupported(name, field)
+            else:
+                current = relation.related_model
+
+        lookup = '__'.join(attrs)
+        self.lookups.append(lookup)
+        return 'raw' if is_pk else 'column', name, lookup
+
+    def _unsupported(self, name, field):
+        return ImproperlyConfigured(
+            f'{self.model.__name__} field {name!r} ({type(field).__name__}) cannot be read with '
+            f'values(); give it an expression in Meta.values_expressions.'
+        )
+
+    def values(self, queryset, parent=None):
+        """``queryset`` narrowed to the columns the serializer reads."""
+        expressions = dict(self.expressions)
+        if parent is not None:
+            expressions[PARENT] = F(parent)
+        # prefetches only apply to model instances
+        return queryset.prefetch_related(None).values('pk', *self.lookups, **expressions)
+
+    def render(self, rows, serializer):
+        """
+        Serialize ``rows`` from ``values()`` with the fields of
+        ``serializer``, which must be an instance of the projected class.
+        """
+        rows = list(rows)
+        fields = serializer.fields
+        ids = [row['pk'] for row in rows]
+        related = [self._fetch_related(relation, ids, fields) for relation in self.related]
+        joined = {
+            name: self._fetch_joined(model, child, {row[key] for row in rows}, fields[name])
+            for name, (model, key, child) in self.joined.items()
+        }
+        steps = [
+            (kind, name, key, self.prepare.get(name), fields[name].to_representation if kind == 'column' else None)
+            for kind, name, key in self.steps
+        ]
+
+        data = []
+        for row in rows:
+            item = {}
+            for kind, name, key, prepare, convert in steps:
+                if kind == 'related':
+                    item[name] = related[key].get(row['pk'], [])
+                    continue
+                if kind == 'joined':
+                    item[name] = joined[name].get(row[key])
+                    continue
+                value = row[key]
+                if value is not None:
+                    if prepare is not None:
+                        value = prepare(value)
+                    if convert is not None:
+                        value = convert(value)
+                item[name] = value
+            data.append(item)
+        return data
+
+    def _fetch_related(self, relation, ids, fields):
+        name, model, link, child = relation
+        groups = defaultdict(list)
+        if not ids:
+            return groups
+        queryset = model._default_manager.filter(**{f'{link}__in': ids})
+        if child is None:
+            for parent, pk in queryset.values_list(link, 'pk'):
+                groups[parent].append(pk)
+            return groups
+
+        rows = list(child.values(queryset, parent=link))
+        for row, item in zip(rows, child.render(rows, fields[name].child)):
+            groups[row[PARENT]].append(item)
+        return groups
+
+    def _fetch_joined(self, model, child, keys, serializer):
+        keys.discard(None)
+        if not keys:
+            return {}
+        rows = list(child.values(model._default_manager.filter(pk__in=keys)))
+        return {row['pk']: item for row, item in zip(rows, child.render(rows, serializer))}
+
+
+def _child_projection(serializer, model):
+    return get_projection(type(serializer), model, None, getattr(serializer, 'expand', None) or None)
+
+
+@lru_cache(maxsize=None)
+def get_projection(serializer_class, model, fields=None, expand=None):
+    return Projection(serializer_class, model, fields, expand)
+
+
+def projection_for(serializer, model):
+    """The projection of ``serializer`` as narrowed by ``SparseFieldsMixin`` and ``ExpandableFieldsMixin``."""
+    return get_projection(
+        type(serializer), model, getattr(serializer, 'sparse_fields', None), getattr(serializer, 'expand', None) or None
+    )
+
+
+class ValuesListMixin:
+    """
+    Generic list view mixin that fetches the list with ``.values()`` for
+    exactly the serializer's fields and serializes from the plain dicts,
+    skipping model instantiation. Set ``use_values = False`` to go through
+    the serializer as usual.
+    """
+    use_values = True
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_values:
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.get_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        projection = projection_for(serializer, queryset.model)
+        rows = projection.values(queryset)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(projection.render(page, serializer))
+        return Response(projection.render(rows, serializer))
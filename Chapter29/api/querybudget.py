@@ -0,0 +1,36 @@
+def query_budget(queries):
+    """
+    Declare the maximum number of SQL queries a view handler may run,
+    authentication included::
+
+        @query_budget(3)
+        def list(self, request, *args, **kwargs):
+            ...
+
+    Views can declare the same thing with a ``query_budget`` attribute, either
+    an int for every handler or a dict keyed by action / HTTP method name.
+    """
+    def decorator(func):
+        func.query_budget = queries
+        return func
+    return decorator
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_query_budget(view_class, name):
+    """
+    Return the query budget declared for handler ``name`` of
+    ``view_class``, or None when there is none.
+    """
+    handler = getattr(view_class, name, None)
+    budget = getattr(handler, 'query_budget', None)
+    if budget is not None:
+        return budget
+
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(name)
+    return budget
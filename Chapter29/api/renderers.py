@@ -0,0 +1,91 @@
+import datetime
+import decimal
+import uuid
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# MessagePack extension type codes, shared with api.parsers
+EXT_DECIMAL = 1
+EXT_UUID = 2
+EXT_DATETIME = 3
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` producing the same bytes through orjson when it is
+    installed. Decimal, UUID and datetime values are handled the way DRF's
+    encoder handles them; indented output (the browsable API), non-default
+    JSON settings and anything orjson refuses go through the stdlib path.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            # integers above 64 bits, aware times, ...: let the stdlib
+            # encoder render or reject them
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # same escaping as JSONRenderer, keeping the output a javascript subset
+        if b'\xe2\x80' in ret:
+            ret = ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+        return ret
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(obj).encode())
+    if isinstance(obj, uuid.UUID):
+        return msgpack.ExtType(EXT_UUID, obj.bytes)
+    if isinstance(obj, datetime.datetime):
+        # aware datetimes use the standard Timestamp type; naive ones have
+        # no instant to encode, ISO 8601 keeps them as they are
+        return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode())
+    # dates, lazy strings, querysets, ...: the same fallbacks as JSON
+    return JSONEncoder().default(obj)
+
+
+def native_types(request):
+    """Whether the renderer negotiated for ``request`` takes Decimal, UUID and datetime objects."""
+    return getattr(getattr(request, 'accepted_renderer', None), 'native_types', False)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack with extension types for Decimal (its string form), UUID
+    (16 bytes) and datetime (the standard Timestamp type, in UTC).
+    ``native_types`` asks serializers using ``NativeTypesMixin`` to hand
+    those over as objects rather than JSON-friendly strings.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    native_types = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True, datetime=True)
@@ -0,0 +1,164 @@
+import hashlib
+import struct
+import time
+from functools import wraps
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import cc_delim_re, has_vary_header, patch_response_headers, patch_vary_headers
+from django.utils.http import http_date
+
+from api.conditional import request_generations
+from api.metrics import cache_requests
+
+# version (B), status (H), expiry as unix time (I), length of the header
+# block (H); then the header block and the body
+RECORD = struct.Struct('!BHIH')
+VERSION = 1
+
+# the headers a cached response keeps; everything else is per request,
+# including the validators conditional_list computes for each requester
+STORED_HEADERS = ('Content-Type', 'Content-Encoding', 'Content-Language', 'Vary')
+
+
+def pack_response(response, expires):
+    """Encode a rendered ``response`` as the bytes ``unpack_response`` reads."""
+    head = '\r\n'.join(
+        f'{name}: {response[name]}' for name in STORED_HEADERS if response.has_header(name)
+    ).encode('latin-1')
+    return RECORD.pack(VERSION, response.status_code, int(expires), len(head)) + head + response.content
+
+
+def unpack_response(data):
+    """Rebuild the response ``pack_response`` encoded, or None if ``data`` is in another format."""
+    if len(data) < RECORD.size:
+        return None
+    version, status, expires, head_length = RECORD.unpack_from(data)
+    if version != VERSION:
+        return None
+    start = RECORD.size + head_length
+    head = data[RECORD.size:start].decode('latin-1')
+    headers = dict(line.split(': ', 1) for line in head.split('\r\n')) if head else {}
+    body = data[start:]
+    headers['Content-Length'] = str(len(body))
+    # what patch_response_headers sets, counting down to the stored expiry
+    headers['Expires'] = http_date(expires)
+    headers['Cache-Control'] = f'max-age={max(0, int(expires - time.time()))}'
+    response = HttpResponse(body, status=status, headers=headers)
+    if 'Content-Type' not in headers:
+        del response['Content-Type']
+    return response
+
+
+class RawCache:
+    """
+    Bytes in and out of a cache. On django-redis the values go straight to
+    the Redis client, skipping the pickle round trip, under the same keys
+    the cache would use, so ``delete_pattern`` still finds them.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+        client = getattr(self.cache, 'client', None)
+        self.client = client if hasattr(client, 'get_client') else None
+
+    def get(self, key):
+        if self.client is None:
+            return self.cache.get(key)
+        return self.client.get_client(write=False).get(self.client.make_key(key))
+
+    def set(self, key, value, timeout):
+        if self.client is None:
+            return self.cache.set(key, value, timeout)
+        self.client.get_client(write=True).set(self.client.make_key(key), value, ex=timeout)
+
+
+def _url_hash(request):
+    return hashlib.md5(request.build_absolute_uri().encode('ascii'), usedforsecurity=False).hexdigest()
+
+
+def _headers_key(key_prefix, request):
+    return f'api.response.{key_prefix}.headers.{_url_hash(request)}'
+
+
+def _response_key(key_prefix, request, headers):
+    context = hashlib.md5(usedforsecurity=False)
+    for header in headers:
+        value = request.META.get('HTTP_' + header.upper().replace('-', '_'))
+        if value is not None:
+            context.update(value.encode())
+    return f'api.response.{key_prefix}.{_url_hash(request)}.{context.hexdigest()}'
+
+
+def served_from_cache(request):
+    """Whether ``cache_response`` (or ``cache_page``) answered ``request`` from the cache."""
+    return getattr(request, '_response_cache_hit', False) or getattr(request, '_cache_update_cache', None) is False
+
+
+def _versioned(key_prefix, depends_on, request):
+    if not depends_on:
+        return key_prefix
+    generations = '.'.join(repr(generation) for generation in request_generations(request, *depends_on))
+    return f'{key_prefix}.{hashlib.md5(generations.encode(), usedforsecurity=False).hexdigest()}'
+
+
+def cache_response(timeout, key_prefix, cache='default', depends_on=()):
+    """
+    ``cache_page`` for API list views that stores the rendered body and a
+    few headers as plain bytes (see ``pack_response``) rather than the
+    pickled response. The key varies on the headers the response names in
+    Vary, learned after DRF and the view mixins have added theirs, and on
+    the generations of the ``depends_on`` models (see ``api.conditional``),
+    so a ``bump_generation`` retires the cached responses without deleting
+    them. Hits and misses are counted under ``key_prefix``.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            prefix = _versioned(key_prefix, depends_on, request)
+            store = RawCache(cache)
+            headers = store.get(_headers_key(prefix, request))
+            if headers is not None:
+                headers = headers.decode().split(',') if headers else []
+                data = store.get(_response_key(prefix, request, headers))
+                response = unpack_response(data) if data is not None else None
+                if response is not None:
+                    request._response_cache_hit = True
+                    cache_requests.inc(prefix=key_prefix, result='hit')
+                    return response
+
+            cache_requests.inc(prefix=key_prefix, result='miss')
+            response = view_func(request, *args, **kwargs)
+            if request.method != 'GET':
+                return response
+            # as cache_page: a response to an authenticated request is per credentials
+            if request.META.get('HTTP_AUTHORIZATION'):
+                patch_vary_headers(response, ('Authorization',))
+
+            def store_response(rendered):
+                if rendered.streaming or rendered.status_code != 200 or has_vary_header(rendered, '*'):
+                    return
+                if rendered.cookies and has_vary_header(rendered, 'Cookie'):
+                    return
+                cache_control = rendered.get('Cache-Control', '').lower()
+                if any(directive in cache_control for directive in ('private', 'no-cache', 'no-store')):
+                    return
+                patch_response_headers(rendered, timeout)
+                vary = sorted({h.strip().lower() for h in cc_delim_re.split(rendered.get('Vary', '')) if h.strip()})
+                store.set(_headers_key(prefix, request), ','.join(vary).encode(), timeout)
+                store.set(
+                    _response_key(prefix, request, vary),
+                    pack_response(rendered, time.time() + timeout),
+                    timeout
+                )
+
+            if hasattr(response, 'render') and callable(response.render):
+                response.add_post_render_callback(store_response)
+            else:
+                store_response(response)
+            return response
+        return wrapper
+    return decorator
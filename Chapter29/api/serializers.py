@@ -1,16 +1,121 @@
+from decimal import Decimal
+
 from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce, Concat, Trim
+from django.utils.module_loading import import_string
 from rest_framework import serializers
+from .compiled import CompiledListSerializer
+from .prefetch import get_relation
+from .renderers import native_types
 from .models import Product, Order, OrderItem, User
+from .nplusone import TrackFieldsMixin
+
+
+class NativeUUIDField(serializers.UUIDField):
+    def to_representation(self, value):
+        return value
+
+
+class NativeTypesMixin:
+    """
+    Hand Decimal, UUID and datetime values to the renderer as objects when
+    the negotiated renderer encodes them natively (MessagePack), instead of
+    the strings JSON needs.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not native_types(self.context.get('request')):
+            return fields
+
+        for name, field in fields.items():
+            if isinstance(field, serializers.DecimalField):
+                field.coerce_to_string = False
+            elif isinstance(field, serializers.DateTimeField):
+                field.format = None
+            elif type(field) is serializers.UUIDField:
+                fields[name] = NativeUUIDField(*field._args, **field._kwargs)
+        return fields
+
+
+class SparseFieldsMixin:
+    """
+    Take ``fields``, the names of the fields to render, leaving the others
+    out (see ``api.fieldsets``). For reading only: left out fields are not
+    validated either.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        self.sparse_fields = tuple(fields) if fields is not None else None
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.sparse_fields is None:
+            return fields
+        # a relation that is not expanded may have no shallow form
+        return {name: fields[name] for name in self.sparse_fields if name in fields}
+
+
+def expandable_serializer(spec):
+    """The serializer class of a ``Meta.expandable`` entry, given as a class or a dotted path."""
+    return import_string(spec) if isinstance(spec, str) else spec
+
+
+def expanded_below(expand, name):
+    """The expansion paths under relation ``name``: ``items.product`` is ``product`` for ``items``."""
+    prefix = f'{name}.'
+    return tuple(path[len(prefix):] for path in expand if path.startswith(prefix))
+
+
+class ExpandableFieldsMixin:
+    """
+    Render the relations in ``Meta.expandable`` shallow unless named in
+    ``expand``, dotted paths like ``('items', 'items.product')`` (see
+    ``api.fieldsets``)::
+
+        class Meta:
+            expandable = {'items': (OrderItemSerializer, {'many': True})}
 
+    A shallow foreign key is its primary key, which is in the row already;
+    a shallow reverse or many-to-many relation is left out, as listing its
+    keys would cost a query.
+    """
 
-class UserSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, expand=None, **kwargs):
+        self.expand = tuple(expand) if expand else ()
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        model = self.Meta.model
+        for name, (spec, kwargs) in getattr(self.Meta, 'expandable', {}).items():
+            if name in self.expand:
+                serializer_class = expandable_serializer(spec)
+                if issubclass(serializer_class, ExpandableFieldsMixin):
+                    kwargs = {**kwargs, 'expand': expanded_below(self.expand, name)}
+                fields[name] = serializer_class(read_only=True, **kwargs)
+                continue
+            relation = get_relation(model, name)
+            if name in fields and not (relation is not None and relation.concrete and not relation.many_to_many):
+                del fields[name]
+        return fields
+
+
+class UserSerializer(TrackFieldsMixin, SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('password', 'user_permissions', 'is_authenticated', 'get_full_name', 'orders')
+        expandable = {'orders': ('api.serializers.OrderSerializer', {'many': True})}
+        values_expressions = {
+            'is_authenticated': Value(True),
+            'get_full_name': Trim(Concat('first_name', Value(' '), 'last_name')),
+        }
         # exclude = ('password', 'user_permissions')
         # fields = '__all__'
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TrackFieldsMixin, SparseFieldsMixin, NativeTypesMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = (
@@ -19,6 +124,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'price',
             'stock',
         )
+        list_serializer_class = CompiledListSerializer
 
     def validate_price(self, value):
         if value <= 0:
@@ -26,27 +132,40 @@ class ProductSerializer(serializers.ModelSerializer):
                 "Price must be greater than 0."
             )
         return value
+
+
+class ProductSyncSerializer(ProductSerializer):
+    class Meta(ProductSerializer.Meta):
+        fields = ('id', *ProductSerializer.Meta.fields, 'updated_at')
     
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    product_name = serializers.CharField(source='product.name')
-    product_price = serializers.DecimalField(
-        max_digits=10,
-        decimal_places=2,
-        source='product.price')
+class UserSummarySerializer(TrackFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'email')
 
+
+class OrderItemSerializer(TrackFieldsMixin, ExpandableFieldsMixin, NativeTypesMixin, serializers.ModelSerializer):
     class Meta:
         model = OrderItem
         fields = (
-            'product_name',
-            'product_price',
+            'product',
             'quantity',
             'item_subtotal'
         )
+        expandable = {'product': (ProductSerializer, {})}
+        related_hints = {'item_subtotal': ['product']}
+        values_expressions = {
+            'item_subtotal': ExpressionWrapper(
+                F('product__price') * F('quantity'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+        }
+        list_serializer_class = CompiledListSerializer
 
 
-class OrderCreateSerializer(serializers.ModelSerializer):
-    class OrderItemCreateSerializer(serializers.ModelSerializer):
+class OrderCreateSerializer(TrackFieldsMixin, NativeTypesMixin, serializers.ModelSerializer):
+    class OrderItemCreateSerializer(TrackFieldsMixin, serializers.ModelSerializer):
         class Meta:
             model = OrderItem
             fields = ('product', 'quantity')
@@ -55,11 +174,9 @@ class OrderCreateSerializer(serializers.ModelSerializer):
     items = OrderItemCreateSerializer(many=True, required=False)
 
     def update(self, instance, validated_data):
-        orderitem_data = validated_data.pop('items')
+        orderitem_data = validated_data.pop('items', None)
 
         with transaction.atomic():
-            instance = super().update(instance, validated_data)
-
             if orderitem_data is not None:
                 # Clear existing items (optional, depends on requirements)
                 instance.items.all().delete()
@@ -67,6 +184,9 @@ class OrderCreateSerializer(serializers.ModelSerializer):
                 # Recreate items with the updated data
                 for item in orderitem_data:
                     OrderItem.objects.create(order=instance, **item)
+
+            # saved last, so updated_at covers the item changes for sync
+            instance = super().update(instance, validated_data)
         return instance
 
 
@@ -95,12 +215,15 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         }
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TrackFieldsMixin, SparseFieldsMixin, ExpandableFieldsMixin, NativeTypesMixin,
+                      serializers.ModelSerializer):
     order_id = serializers.UUIDField(read_only=True)
-    items = OrderItemSerializer(many=True, read_only=True)
     total_price = serializers.SerializerMethodField(method_name='total')
 
     def total(self, obj):
+        if hasattr(obj, 'total_price'):
+            # annotated from Meta.values_expressions, see api.prefetch.prefetch_queryset
+            return obj.total_price.quantize(Decimal('0.01'))
         order_items = obj.items.all()
         return sum(order_item.item_subtotal for order_item in order_items)
 
@@ -114,9 +237,27 @@ class OrderSerializer(serializers.ModelSerializer):
             'items',
             'total_price',
         )
+        expandable = {
+            'items': (OrderItemSerializer, {'many': True}),
+            'user': (UserSummarySerializer, {}),
+        }
+        related_hints = {'total_price': ['items__product']}
+        values_expressions = {
+            'total_price': Coalesce(
+                Sum(F('items__product__price') * F('items__quantity')),
+                Value(Decimal(0)),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+        }
+        list_serializer_class = CompiledListSerializer
+
+
+class OrderSyncSerializer(OrderSerializer):
+    class Meta(OrderSerializer.Meta):
+        fields = (*OrderSerializer.Meta.fields, 'updated_at')
 
 
-class ProductInfoSerializer(serializers.Serializer):
+class ProductInfoSerializer(TrackFieldsMixin, serializers.Serializer):
     products = ProductSerializer(many=True)
     count = serializers.IntegerField()
     max_price = serializers.FloatField()
@@ -1,15 +1,76 @@
+from functools import partial
+
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from api.models import Product
-from django.core.cache import cache
+from api.conditional import bump_generation
+from api.models import Order, OrderItem, Product, ProductTombstone, User
+from api.objectcache import cache_representation, forget_missing, forget_representation
+from api.serializers import ProductSerializer
+from api.utils import on_commit_once
 
 
 @receiver([post_save, post_delete], sender=Product)
-def invalidate_product_cache(sender, instance, **kwargs):
+def invalidate_product_cache(sender, instance, using, **kwargs):
+    """
+    Invalidate product list caches when a product is created, updated, or deleted:
+    their keys and ETags carry the Product generation. Bumped on commit, so
+    a list read before then cannot be cached under the new generation
+    """
+    on_commit_once(bump_generation, Product, using=using)
+
+
+@receiver(post_save, sender=Product)
+def cache_product(sender, instance, using, **kwargs):
+    """
+    Write the saved product through to its cached representation (see CachedObjectMixin)
+    on commit, after any representation a request read before then
+    """
+    transaction.on_commit(partial(cache_representation, ProductSerializer, instance), using=using)
+
+
+@receiver(post_delete, sender=Product)
+def forget_product(sender, instance, using, **kwargs):
+    on_commit_once(forget_representation, ProductSerializer, Product, instance.pk, using=using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+def forget_missing_object(sender, instance, created, using, **kwargs):
+    """
+    A created product or order is no longer a 404 (see NegativeCacheMixin),
+    once it is committed: a GET before then would cache the 404 again
+    """
+    if created:
+        on_commit_once(forget_missing, sender, instance.pk, using=using)
+
+
+@receiver(post_delete, sender=Product)
+def record_product_deletion(sender, instance, **kwargs):
+    """
+    Leave a tombstone for product sync (see ProductSyncAPIView)
+    """
+    ProductTombstone.objects.create(product_id=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=OrderItem)
+def invalidate_order_cache(sender, instance, using, **kwargs):
+    """
+    Invalidate order list caches when an order or one of its items changes:
+    their keys and ETags carry the Order generation. Bumped once, on commit
+    of the transaction saving the order and its items
+    """
+    on_commit_once(bump_generation, Order, using=using)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, using, update_fields=None, **kwargs):
     """
-    Invalidate product list caches when a product is created, updated, or deleted
+    Invalidate order list caches when a user changes, for ?expand=user:
+    their keys and ETags carry the User generation, bumped on commit
     """
-    print("Clearing product cache")
-    
-    # Clear product list caches
-    cache.delete_pattern('*product_list*')
\ No newline at end of file
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        # logging in does not change what the lists show
+        return
+    on_commit_once(bump_generation, User, using=using)
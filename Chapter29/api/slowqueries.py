@@ -0,0 +1,214 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import DatabaseError
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from api.utils import is_explain, view_label
+
+DEFAULTS = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 100,
+    # distinct fingerprints kept; the least recently seen one is evicted
+    'MAX_ENTRIES': 200,
+    'EXPLAIN': True,
+    'TIMEOUT': 60 * 60 * 24 * 7,
+}
+
+CACHE_PREFIX = 'slow_queries'
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_local = threading.local()
+_options = {}
+
+
+def get_slow_query_settings():
+    return {**DEFAULTS, **getattr(settings, 'SLOW_QUERY_LOG', {})}
+
+
+@receiver(setting_changed)
+def _reload_settings(setting, **kwargs):
+    if setting == 'SLOW_QUERY_LOG':
+        _options.update(get_slow_query_settings())
+
+
+def fingerprint(sql):
+    """
+    Normalize ``sql`` so queries that differ only in their parameters
+    share a fingerprint: literals and placeholders become ``?`` and
+    ``IN (...)`` lists collapse whatever their length.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def explain(connection, sql, params):
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN'
+    else:
+        prefix = connection.ops.explain_query_prefix()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except DatabaseError as exc:
+        return f'EXPLAIN failed: {exc}'
+
+
+class SlowQueryLog:
+    """
+    Slow queries aggregated by fingerprint, kept in the cache so every
+    process reports into (and the management command reads from) the same
+    bounded store. Updates are read-modify-write, so concurrent writers may
+    occasionally lose a count.
+    """
+    index_key = f'{CACHE_PREFIX}:index'
+
+    def entry_key(self, digest):
+        return f'{CACHE_PREFIX}:{digest}'
+
+    def record(self, sql, duration, view, plan_for):
+        normalized = fingerprint(sql)
+        digest = hashlib.md5(normalized.encode(), usedforsecurity=False).hexdigest()
+        key = self.entry_key(digest)
+        now = time.time()
+
+        stored = cache.get_many([self.index_key, key])
+        index = stored.get(self.index_key, {})
+        entry = stored.get(key)
+        if entry is None:
+            entry = {
+                'fingerprint': normalized,
+                'sample': sql,
+                'plan': plan_for() if _options['EXPLAIN'] else None,
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'views': {},
+                'first_seen': now,
+            }
+        entry['count'] += 1
+        entry['total_ms'] += duration * 1000
+        entry['max_ms'] = max(entry['max_ms'], duration * 1000)
+        entry['views'][view] = entry['views'].get(view, 0) + 1
+        entry['last_seen'] = now
+
+        index[digest] = now
+        evicted = []
+        while len(index) > _options['MAX_ENTRIES']:
+            oldest = min(index, key=index.get)
+            del index[oldest]
+            evicted.append(self.entry_key(oldest))
+
+        cache.set_many({key: entry, self.index_key: index}, _options['TIMEOUT'])
+        if evicted:
+            cache.delete_many(evicted)
+
+    def entries(self):
+        index = cache.get(self.index_key, {})
+        return list(cache.get_many([self.entry_key(digest) for digest in index]).values())
+
+    def clear(self):
+        index = cache.get(self.index_key, {})
+        cache.delete_many([self.entry_key(digest) for digest in index] + [self.index_key])
+
+
+slow_query_log = SlowQueryLog()
+
+
+def flush(pending):
+    """
+    Record the slow queries in ``pending``. The log is a diagnostic: a
+    cache that is down or slow is logged, never raised to the request.
+    """
+    # our own EXPLAIN and cache traffic must not be logged
+    _local.active = True
+    try:
+        for sql, duration, view, plan_for in pending:
+            try:
+                slow_query_log.record(sql, duration, view, plan_for)
+            except Exception:
+                logger.exception('Could not record a slow query')
+    finally:
+        _local.active = False
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    if getattr(_local, 'active', False) or not _options['ENABLED']:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        # other tools (silk) run their own EXPLAINs, those are not interesting
+        if duration * 1000 >= _options['THRESHOLD_MS'] and not is_explain(sql):
+            connection = context['connection']
+            can_explain = not many and sql.lstrip()[:7].upper().startswith(('SELECT', 'WITH'))
+
+            def plan_for():
+                return explain(connection, sql, params) if can_explain else None
+
+            entry = (sql, duration, getattr(_local, 'view', None) or 'unknown', plan_for)
+            pending = getattr(_local, 'pending', None)
+            if pending is not None:
+                # SlowQueryViewMiddleware records them once the response is ready
+                pending.append(entry)
+            else:
+                flush([entry])
+
+
+@receiver(connection_created)
+def install(sender, connection, **kwargs):
+    """
+    Put the slow query wrapper on every new database connection. It goes
+    first in the list so ``connection.execute_wrapper()`` blocks, which pop
+    the last wrapper on exit, never remove it.
+    """
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_wrapper)
+
+
+class SlowQueryViewMiddleware:
+    """
+    Tell the slow query log which view is running on this thread, and
+    record the slow queries of the request after it, not in the middle of
+    the database calls.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.pending = []
+        try:
+            return self.get_response(request)
+        finally:
+            pending, _local.pending = _local.pending, None
+            _local.view = None
+            flush(pending)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.view = view_label(view_func, request.method)
+        return None
+
+
+_options.update(get_slow_query_settings())
@@ -0,0 +1,116 @@
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
+
+from api.projection import projection_for
+from api.renderers import FastJSONRenderer
+
+
+class StreamingRenderer(FastJSONRenderer):
+    """
+    Base for renderers a list view can stream with. Anything that is not
+    streamed (a single object, an error) is rendered whole by ``render()``.
+    """
+    content_type = None
+
+    def stream(self, chunks):
+        """Yield the encoded body for an iterable of lists of items."""
+        raise NotImplementedError
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """Newline delimited JSON: one item per line. Select with ``Accept: application/x-ndjson``."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    content_type = 'application/x-ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, list):
+            return b''.join(self.render_line(item) for item in data)
+        return self.render_line(data)
+
+    def render_line(self, item):
+        return super().render(item) + b'\n'
+
+    def stream(self, chunks):
+        for chunk in chunks:
+            yield b''.join(self.render_line(item) for item in chunk)
+
+
+class JSONArrayStreamRenderer(StreamingRenderer):
+    """
+    A plain JSON array, sent chunk by chunk. Select with
+    ``Accept: application/json; stream=true``; it has to come before the
+    JSON renderer so that parameter is looked at.
+    """
+    media_type = 'application/json; stream=true'
+    format = 'json-stream'
+    content_type = 'application/json'
+
+    def stream(self, chunks):
+        yield b'['
+        first = True
+        for chunk in chunks:
+            if not chunk:
+                continue
+            # render the chunk as an array and drop the brackets
+            body = self.render(chunk)[1:-1]
+            yield body if first else b',' + body
+            first = False
+        yield b']'
+
+
+STREAMING_RENDERER_CLASSES = [
+    JSONArrayStreamRenderer,
+    *api_settings.DEFAULT_RENDERER_CLASSES,
+    NDJSONRenderer,
+]
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class StreamingListMixin:
+    """
+    List view mixin answering requests for a streaming renderer with a
+    ``StreamingHttpResponse``. The queryset is read with
+    ``.iterator(chunk_size=...)`` and serialized one chunk at a time, with
+    prefetches (or the related ``values()`` queries of ``ValuesListMixin``)
+    done per chunk, so memory stays flat whatever the result size.
+
+    The queries run while the body is sent, after the middleware has
+    returned, so query budgets and the N+1 detector do not see them.
+    """
+    renderer_classes = STREAMING_RENDERER_CLASSES
+    stream_chunk_size = 1000
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, StreamingRenderer):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(
+            renderer.stream(self.stream_chunks(queryset)),
+            content_type=renderer.content_type
+        )
+
+    def stream_chunks(self, queryset):
+        """Yield the serialized list in chunks of ``stream_chunk_size`` items."""
+        size = self.stream_chunk_size
+        if getattr(self, 'use_values', False):
+            serializer = self.get_serializer()
+            projection = projection_for(serializer, queryset.model)
+            rows = projection.values(queryset).iterator(chunk_size=size)
+            for chunk in batched(rows, size):
+                yield projection.render(chunk, serializer)
+            return
+
+        for chunk in batched(queryset.iterator(chunk_size=size), size):
+            yield self.get_serializer(chunk, many=True).data
@@ -0,0 +1,69 @@
+from datetime import timedelta, timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone as django_timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+DEFAULTS = {
+    # a change only syncs once it is this old: updated_at is set when the
+    # row is saved, not when its transaction commits, so a cursor past a
+    # younger change could skip one still being committed before it
+    'LAG_SECONDS': 5,
+    # changes per sync response; the client follows has_more
+    'PAGE_SIZE': 500,
+}
+
+
+def get_sync_settings():
+    return {**DEFAULTS, **getattr(settings, 'SYNC', {})}
+
+
+def sync_horizon():
+    """The latest change time a sync hands out, ``LAG_SECONDS`` ago."""
+    return django_timezone.now() - timedelta(seconds=get_sync_settings()['LAG_SECONDS'])
+
+
+def format_cursor(value, key=None):
+    """
+    A sync cursor for the change time ``value`` of the change ``key``: ISO
+    8601 in UTC, then ``~key`` to order the changes of the same instant,
+    safe in a query string.
+    """
+    if value is None:
+        return None
+    cursor = value.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+    return cursor if key is None else f'{cursor}~{key}'
+
+
+def parse_cursor(value, param='changed_since', parse_key=str):
+    """
+    The change time and ``parse_key`` of the key in a cursor from
+    ``format_cursor``, (None, None) when there is none. A cursor without a
+    key stands after every change of its instant.
+    """
+    if not value:
+        return None, None
+    value, _, key = value.partition('~')
+    try:
+        parsed = parse_datetime(value)
+        key = parse_key(key) if key else None
+    except (TypeError, ValueError):
+        parsed = None
+    if parsed is None:
+        raise ValidationError({param: 'Expected a cursor returned by a previous sync.'})
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed, key
+
+
+def changed_after(field, value, pk=None):
+    """
+    The rows after the change at ``value`` of the row ``pk`` in
+    ``(field, 'pk')`` order, after every row changed at ``value`` without one.
+    """
+    after = Q(**{f'{field}__gt': value})
+    if pk is None:
+        return after
+    return after | Q(**{field: value, 'pk__gt': pk})
@@ -1,5 +1,57 @@
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest import skipIf
+from unittest.mock import Mock, patch
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from api.models import User, Product
+from django.utils import timezone
+from api.benchmarks import (INSTRUMENTATION_MIDDLEWARE, compare_to_baseline, endpoint_settings, percentile,
+                            run_concurrently)
+from api.management.commands import bench_order_keys
+from api import compression, responsecache
+from api.compiled import CompiledListSerializer, compile_serializer, generic_serialization
+from api.conditional import get_generation, get_generations
+from api.filters import OrderFilter
+from api.metrics import negative_cache_saved_queries, registry, throttle_rejections
+from api.parsers import FastJSONParser, MessagePackParser
+from api import renderers
+from api.renderers import FastJSONRenderer
+from api.nplusone import NPlusOneError, detect_n_plus_one
+from api.objectcache import cached_representations, object_key
+from api.fieldsets import select_expansion
+from api.prefetch import expression_annotations, only_columns, prefetch_queryset, related_lookups
+from api.profiling import profiler
+from api.projection import get_projection
+from api.serializers import OrderCreateSerializer, OrderSerializer, ProductSerializer, UserSerializer
+from api import slowqueries
+from api.slowqueries import fingerprint, slow_query_log
+from api.sync import format_cursor, parse_cursor
+from api.models import User, Product, Order, OrderItem, ProductTombstone
+from api.querybudget import QueryBudgetExceeded
+from api.uuids import uuid7
+from api.views import OrderViewSet, ProductListCreateAPIView, UserListView
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
 
@@ -41,4 +93,1478 @@ class ProductAPITestCase(APITestCase):
         self.client.login(username='admin', password='adminpass')
         response = self.client.delete(self.url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertFalse(Product.objects.filter(pk=self.product.pk).exists())
\ No newline at end of file
+        self.assertFalse(Product.objects.filter(pk=self.product.pk).exists())
+
+class OrderFilterTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='userpass')
+        self.late_order = Order.objects.create(user=self.user)
+        self.next_day_order = Order.objects.create(user=self.user)
+        # created_at is auto_now_add, so move the orders around afterwards
+        Order.objects.filter(pk=self.late_order.pk).update(
+            created_at=datetime(2024, 1, 1, 23, 30, tzinfo=dt_timezone.utc))
+        Order.objects.filter(pk=self.next_day_order.pk).update(
+            created_at=datetime(2024, 1, 2, 0, 30, tzinfo=dt_timezone.utc))
+
+    def filter_orders(self, params):
+        return set(OrderFilter(params, queryset=Order.objects.all()).qs)
+
+    def test_day_filter_uses_timestamp_range(self):
+        qs = OrderFilter({'created_at': '2024-01-01'}, queryset=Order.objects.all()).qs
+        sql = str(qs.query)
+        self.assertNotIn('django_datetime_cast_date', sql)
+        self.assertIn('>=', sql)
+        self.assertEqual(set(qs), {self.late_order})
+
+    def test_day_filter_uses_current_timezone(self):
+        with timezone.override('Asia/Seoul'):
+            self.assertEqual(self.filter_orders({'created_at': '2024-01-01'}), set())
+            self.assertEqual(
+                self.filter_orders({'created_at': '2024-01-02'}),
+                {self.late_order, self.next_day_order}
+            )
+
+    def test_day_range_filter(self):
+        self.assertEqual(
+            self.filter_orders({'created_at_range_after': '2024-01-01', 'created_at_range_before': '2024-01-02'}),
+            {self.late_order, self.next_day_order}
+        )
+        self.assertEqual(
+            self.filter_orders({'created_at_range_after': '2024-01-02'}),
+            {self.next_day_order}
+        )
+        self.assertEqual(
+            self.filter_orders({'created_at_range_before': '2024-01-01'}),
+            {self.late_order}
+        )
+
+
+class UUID7TestCase(APITestCase):
+    def test_uuid7_is_time_ordered(self):
+        ids = [uuid7() for _ in range(5000)]
+        self.assertTrue(all(value.version == 7 for value in ids))
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_order_uses_uuid7(self):
+        user = User.objects.create_user(username='user', password='userpass')
+        order = Order.objects.create(user=user)
+        self.assertEqual(order.order_id.version, 7)
+
+    def test_bench_schema_mirrors_the_models(self):
+        db = sqlite3.connect(':memory:')
+        db.executescript(bench_order_keys.SCHEMA)
+        for model in (Order, OrderItem):
+            table = model._meta.db_table
+            columns = [row[1] for row in db.execute(f'PRAGMA table_info({table})')]
+            self.assertEqual(columns, [field.column for field in model._meta.local_concrete_fields])
+
+            indexed = {
+                tuple(row[2] for row in db.execute(f'PRAGMA index_info({name})'))
+                for _, name, _, origin, _ in db.execute(f'PRAGMA index_list({table})') if origin == 'c'
+            }
+            expected = {
+                (field.column,) for field in model._meta.local_concrete_fields
+                if field.db_index and not field.primary_key
+            } | {
+                tuple(model._meta.get_field(name).column for name in index.fields) for index in model._meta.indexes
+            }
+            self.assertEqual(indexed, expected)
+        db.close()
+
+    def test_bench_order_keys(self):
+        out = StringIO()
+        call_command('bench_order_keys', rows=20, batch_size=10, items_per_order=1, stdout=out)
+        self.assertIn('uuid7', out.getvalue())
+
+
+class PopulateDBTestCase(APITestCase):
+    def test_generates_requested_volume(self):
+        call_command(
+            'populate_db', products=10, users=3, orders=20, items_per_order=2,
+            seed=1, batch_size=7, stdout=StringIO()
+        )
+        self.assertEqual(Product.objects.count(), 10)
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertEqual(OrderItem.objects.count(), 40)
+
+    def test_seed_is_deterministic(self):
+        def generate():
+            call_command('populate_db', products=10, orders=5, seed=42, stdout=StringIO())
+            return list(Product.objects.order_by('pk').values_list('name', 'price', 'stock'))
+
+        first = generate()
+        Product.objects.all().delete()
+        self.assertEqual(generate(), first)
+
+
+class BenchmarkHelpersTestCase(SimpleTestCase):
+    # the run_concurrently workers connect to count queries
+    databases = '__all__'
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_compare_to_baseline(self):
+        baseline = {'order_list': {'p95_ms': 10.0, 'throughput_rps': 100.0, 'queries_max': 2}}
+        within = {'order_list': {'p95_ms': 11.0, 'throughput_rps': 90.0, 'queries_max': 2}}
+        self.assertEqual(compare_to_baseline(within, baseline, 0.2), [])
+
+        regressed = {'order_list': {'p95_ms': 20.0, 'throughput_rps': 100.0, 'queries_max': 3}}
+        regressions = compare_to_baseline(regressed, baseline, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(r.startswith('order_list') for r in regressions))
+
+        failed = {'order_list': {**within['order_list'], 'errors': {'OperationalError': 3}}}
+        self.assertEqual(compare_to_baseline(failed, baseline, 0.2), ['order_list: 3 request(s) raised OperationalError'])
+
+    def test_failed_requests_are_recorded(self):
+        def make_request(i):
+            if i % 2:
+                raise DatabaseError('database is locked')
+            return HttpResponse(status=201)
+
+        summary = run_concurrently(make_request, 10, 3)
+        self.assertEqual(summary['requests'], 5)
+        self.assertEqual(summary['status_codes'], {'201': 5})
+        self.assertEqual(summary['errors'], {'DatabaseError': 5})
+
+
+class BenchmarkCommandTestCase(SimpleTestCase):
+    # benchmark_api creates and destroys its own database
+    databases = '__all__'
+
+    def test_every_endpoint_succeeds(self):
+        errors = []
+
+        def run(output, baseline):
+            try:
+                call_command(
+                    'benchmark_api', products=5, users=2, orders=5, items_per_order=2, requests=3, warmup=1,
+                    concurrency=1, output=output, baseline=baseline, stdout=StringIO()
+                )
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        with TemporaryDirectory() as directory, \
+                patch('api.benchmarks.setup_test_environment'), patch('api.benchmarks.teardown_test_environment'):
+            output = os.path.join(directory, 'results.json')
+            # on its own thread, hence connection: closing ours would drop the in-memory test database
+            thread = threading.Thread(target=run, args=(output, os.path.join(directory, 'missing.json')))
+            thread.start()
+            thread.join()
+            self.assertEqual(errors, [])
+            with open(output) as f:
+                results = json.load(f)['endpoints']
+        for name, result in results.items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(result['requests'], 3)
+                self.assertTrue(all(code.startswith('2') for code in result['status_codes']), result)
+        # only the endpoints' own queries, within their budgets
+        self.assertLessEqual(results['product_detail']['queries_max'], 4)
+        self.assertLessEqual(results['order_list']['queries_max'], 5)
+
+    def test_instrumentation_is_off(self):
+        with override_settings(MIDDLEWARE=[*settings.MIDDLEWARE, 'silk.middleware.SilkyMiddleware']):
+            overrides = endpoint_settings()
+        self.assertFalse(set(overrides['MIDDLEWARE']) & set(INSTRUMENTATION_MIDDLEWARE))
+        self.assertIn('django.contrib.auth.middleware.AuthenticationMiddleware', overrides['MIDDLEWARE'])
+        self.assertFalse(overrides['SLOW_QUERY_LOG']['ENABLED'])
+
+
+def reset_caches():
+    """Forget cached responses, objects and throttle history between requests."""
+    for pattern in ('*product_list*', '*order_list*', '*throttle_*', '*api.object.*', '*api.missing.*'):
+        cache.delete_pattern(pattern)
+
+
+@override_settings(
+    QUERY_BUDGETS={'ENABLED': True, 'RAISE': True},
+    MIDDLEWARE=[m for m in settings.MIDDLEWARE if not m.startswith('silk.')],
+)
+class QueryBudgetTestCase(APITestCase):
+    def setUp(self):
+        if apps.is_installed('silk'):
+            # silk keeps instrumenting (and EXPLAINing) queries on this
+            # thread after an earlier test went through its middleware
+            from silk.collector import DataCollector
+            DataCollector().clear()
+        self.admin_user = User.objects.create_superuser(username='admin', password='adminpass')
+        self.client.login(username='admin', password='adminpass')
+        self.products = []
+
+    def create_products(self, total):
+        self.products += Product.objects.bulk_create(
+            Product(name=f'Product {i}', description='', price=Decimal('1.50'), stock=1)
+            for i in range(len(self.products), total)
+        )
+
+    def create_orders(self, total):
+        self.create_products(2)
+        while Order.objects.count() < total:
+            order = Order.objects.create(user=self.admin_user)
+            for product in self.products[:2]:
+                OrderItem.objects.create(order=order, product=product, quantity=2)
+
+    def create_users(self, total):
+        self.create_products(2)
+        while User.objects.count() < total:
+            user = User.objects.create_user(username=f'user{User.objects.count()}')
+            order = Order.objects.create(user=user)
+            OrderItem.objects.create(order=order, product=self.products[0], quantity=1)
+
+    def count_queries(self, url):
+        reset_caches()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx)
+
+    def assert_constant_queries(self, url, create_rows):
+        counts = []
+        for total in (1, 10, 100):
+            create_rows(total)
+            counts.append(self.count_queries(url))
+        self.assertEqual(len(set(counts)), 1, f'{url} query counts grew with rows: {counts}')
+
+    def test_product_list_queries_are_constant(self):
+        self.assert_constant_queries('/products/', self.create_products)
+
+    def test_order_list_queries_are_constant(self):
+        self.assert_constant_queries('/orders/', self.create_orders)
+
+    def test_user_list_queries_are_constant(self):
+        self.assert_constant_queries('/users/', self.create_users)
+
+    def test_detail_endpoints_within_budget(self):
+        self.create_orders(3)
+        order = Order.objects.first()
+        for url in (f'/orders/{order.pk}/', f'/products/{self.products[0].pk}/', '/products/info/'):
+            self.count_queries(url)
+
+    def test_write_endpoints_within_budget(self):
+        self.create_orders(1)
+        order = Order.objects.first()
+        items = [{'product': product.pk, 'quantity': 1} for product in self.products]
+        reset_caches()
+        response = self.client.post('/orders/', {'status': 'Pending', 'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.put(f'/orders/{order.pk}/', {'status': 'Confirmed', 'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.delete(f'/orders/{order.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    @override_settings(MIDDLEWARE=settings.MIDDLEWARE, SLOW_QUERY_LOG={'THRESHOLD_MS': 0})
+    def test_explains_are_not_counted(self):
+        # silk and the slow query log EXPLAIN every query of the request
+        self.create_products(3)
+        with self.assertNoLogs('api.middleware', 'WARNING'):
+            self.count_queries('/products/')
+            self.count_queries(f'/products/{self.products[0].pk}/')
+
+    def test_exceeding_budget_raises(self):
+        self.create_users(3)
+        reset_caches()
+        with patch.object(UserListView, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/users/')
+
+
+@override_settings(PROFILER={'ENABLED': True, 'SAMPLE_RATE': 1, 'RULES': [('/users/', 0)]})
+class SamplingProfilerTestCase(APITestCase):
+    def setUp(self):
+        profiler.reset()
+        reset_caches()
+        self.admin_user = User.objects.create_superuser(username='admin', password='adminpass')
+        self.normal_user = User.objects.create_user(username='user', password='userpass')
+        Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+
+    def test_sampled_requests_are_aggregated_per_view(self):
+        self.client.get('/products/')
+        self.client.get('/users/')
+
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.get('/profiling/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        views = {row['view']: row for row in response.data['views']}
+        self.assertEqual(views['ProductListCreateAPIView.get']['count'], 1)
+        self.assertGreaterEqual(views['ProductListCreateAPIView.get']['avg_queries'], 1)
+        self.assertNotIn('UserListView.get', views)
+
+    def test_stats_are_staff_only(self):
+        self.client.force_authenticate(self.normal_user)
+        response = self.client.get('/profiling/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ServerTimingTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+
+    def phases(self, response):
+        return {entry.split(';')[0] for entry in response['Server-Timing'].split(', ')}
+
+    @override_settings(SERVER_TIMING=True)
+    def test_header_breaks_down_phases(self):
+        response = self.client.get('/products/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.phases(response), {'auth', 'throttle', 'db', 'serialize', 'render'})
+
+        response = self.client.get('/products/')
+        self.assertIn('cache', self.phases(response))
+        self.assertNotIn('serialize', self.phases(response))
+
+    @override_settings(SERVER_TIMING=True)
+    def test_header_on_rejected_requests(self):
+        response = self.client.delete(f'/products/{Product.objects.get().pk}/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('auth', self.phases(response))
+
+    @override_settings(SERVER_TIMING=False)
+    def test_no_header_when_disabled(self):
+        response = self.client.get('/products/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        registry.reset()
+        reset_caches()
+        self.admin_user = User.objects.create_superuser(username='admin', password='adminpass')
+        self.product = Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+
+    def scrape(self):
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.get('/metrics/')
+        self.client.force_authenticate(None)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content.decode()
+
+    def test_request_cache_and_throttle_metrics(self):
+        self.client.get('/products/')
+        self.client.get('/products/')
+        for _ in range(3):
+            self.client.get(f'/products/{self.product.pk}/')
+
+        text = self.scrape()
+        self.assertIn('api_cache_page_requests_total{prefix="product_list",result="miss"} 1', text)
+        self.assertIn('api_cache_page_requests_total{prefix="product_list",result="hit"} 1', text)
+        self.assertIn('api_throttle_rejections_total{scope="anon"} 1', text)
+        self.assertIn('api_request_duration_seconds_count{view="ProductListCreateAPIView.get",method="GET"} 2', text)
+        self.assertIn('api_requests_total{view="ProductDetailAPIView.get",method="GET",status="429"} 1', text)
+        self.assertIn('api_db_queries_per_request_count{view="ProductListCreateAPIView.get"} 2', text)
+
+    def test_metrics_are_staff_only(self):
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_snapshots_from_other_processes_are_summed(self):
+        throttle_rejections.inc(scope='anon')
+        with TemporaryDirectory() as directory:
+            other_process = {
+                'api_throttle_rejections_total': [[['anon'], 2], [['products'], 1]],
+            }
+            with open(os.path.join(directory, '999999.json'), 'w') as f:
+                json.dump(other_process, f)
+            registry.write_snapshot(directory)  # our own file is ignored in favour of live values
+            text = registry.expose(directory)
+        self.assertIn('api_throttle_rejections_total{scope="anon"} 3', text)
+        self.assertIn('api_throttle_rejections_total{scope="products"} 1', text)
+
+
+class SlowQueryLogTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        slow_query_log.clear()
+        Product.objects.create(name='Test Product', description='Lorem ipsum', price=Decimal('9.99'), stock=10)
+
+    def test_fingerprint_ignores_parameters(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x' AND b IN (1, 2, 3) AND c = %s"),
+            fingerprint("SELECT  *  FROM t WHERE a = 'y' AND b IN (4) AND c = %s"),
+        )
+        self.assertEqual(fingerprint('SELECT * FROM t WHERE a = 10'), 'SELECT * FROM t WHERE a = ?')
+
+    @override_settings(SLOW_QUERY_LOG={'THRESHOLD_MS': 0})
+    def test_slow_queries_are_recorded_with_plan_and_view(self):
+        self.client.get('/products/?search=lorem')
+        self.client.get('/products/?search=ipsum')
+
+        entries = [e for e in slow_query_log.entries() if 'LIKE' in e['fingerprint']]
+        self.assertEqual(len(entries), 1)
+        entry = entries[0]
+        self.assertEqual(entry['count'], 2)
+        self.assertEqual(entry['views'], {'ProductListCreateAPIView.get': 2})
+        self.assertIn('SCAN', entry['plan'])
+
+        out = StringIO()
+        call_command('slow_queries', plans=True, stdout=out)
+        self.assertIn('ProductListCreateAPIView.get (2)', out.getvalue())
+
+    @override_settings(SLOW_QUERY_LOG={'THRESHOLD_MS': 0, 'MAX_ENTRIES': 2})
+    def test_store_is_bounded(self):
+        for n in range(4):
+            list(Product.objects.filter(stock__gt=n).values_list('pk')[:n + 1])
+            list(Product.objects.raw(f'SELECT id FROM api_product AS p{n}'))
+        self.assertLessEqual(len(slow_query_log.entries()), 2)
+
+    @override_settings(SLOW_QUERY_LOG={'THRESHOLD_MS': 0})
+    def test_recorded_after_the_request(self):
+        during_request = []
+
+        def record(*args):
+            during_request.append(slowqueries._local.pending is not None)
+
+        with patch.object(slow_query_log, 'record', side_effect=record):
+            self.assertEqual(self.client.get('/products/').status_code, status.HTTP_200_OK)
+        self.assertTrue(during_request)
+        self.assertNotIn(True, during_request)
+
+    @override_settings(SLOW_QUERY_LOG={'THRESHOLD_MS': 0})
+    def test_cache_errors_are_logged(self):
+        with patch.object(slow_query_log, 'record', side_effect=ConnectionError('cache is down')):
+            with self.assertLogs('api.slowqueries', 'ERROR'):
+                self.assertEqual(self.client.get('/products/').status_code, status.HTTP_200_OK)
+            # nor do they hide the error of a failed query
+            with self.assertLogs('api.slowqueries', 'ERROR'), self.assertRaises(DatabaseError):
+                list(Product.objects.raw('SELECT missing_column FROM api_product'))
+
+
+class NPlusOneDetectionTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        self.admin_user = User.objects.create_superuser(username='admin', password='adminpass')
+        self.client.force_authenticate(self.admin_user)
+        product = Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+        for n in range(3):
+            user = User.objects.create_user(username=f'user{n}')
+            order = Order.objects.create(user=user)
+            OrderItem.objects.create(order=order, product=product, quantity=1)
+
+    def test_prefetched_views_pass(self):
+        for url in ('/users/', '/orders/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_list_without_prefetch(self):
+        with patch.object(UserListView, 'auto_prefetch', False), \
+                patch.object(UserListView, 'use_values', False), \
+                patch.object(UserListView, 'queryset', User.objects.prefetch_related('user_permissions')):
+            with self.assertRaisesMessage(NPlusOneError, 'UserSerializer.orders'):
+                self.client.get('/users/?expand=orders')
+
+    @override_settings(NPLUSONE={'ENABLED': True, 'RAISE': False})
+    def test_order_list_without_prefetch_is_logged(self):
+        with patch.object(OrderViewSet, 'auto_prefetch', False), \
+                patch.object(OrderViewSet, 'use_values', False), \
+                patch.object(OrderViewSet, 'queryset', Order.objects.prefetch_related('items')):
+            with self.assertLogs('api.nplusone', 'WARNING') as logs:
+                response = self.client.get('/orders/?expand=items.product')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('OrderSerializer.items > OrderItemSerializer.product', logs.output[0])
+
+    def test_detector_outside_requests(self):
+        orders = Order.objects.all()
+        with detect_n_plus_one(raise_errors=False) as detector:
+            OrderSerializer(orders, many=True, expand=('items', 'items.product')).data
+        fields = [report.split(' ran ')[0] for report in detector.reports]
+        self.assertEqual(fields, [
+            'N+1 query: OrderSerializer.items',
+            'N+1 query: OrderSerializer.items > OrderItemSerializer.product',
+            'N+1 query: OrderSerializer.total_price',
+            'N+1 query: OrderSerializer.total_price',
+        ])
+
+
+class AutoPrefetchTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        self.admin_user = User.objects.create_superuser(username='admin', password='adminpass')
+        self.client.force_authenticate(self.admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+            for n in range(3):
+                order = Order.objects.create(user=self.admin_user)
+                OrderItem.objects.create(order=order, product=product, quantity=n + 1)
+
+    def test_lookups_follow_serializer_fields(self):
+        # shallow orders read their total from an annotation
+        self.assertEqual(related_lookups(OrderSerializer, Order), ((), ()))
+        self.assertEqual(list(expression_annotations(OrderSerializer)), ['total_price'])
+
+        select, prefetch = related_lookups(OrderSerializer, Order, None, ('items', 'user'))
+        self.assertEqual(select, ('user',))
+        self.assertEqual([lookup.prefetch_to for lookup in prefetch], ['items'])
+        # the product of the item subtotals is joined into the items query
+        self.assertEqual(prefetch[0].queryset.query.select_related, {'product': {}})
+
+        self.assertEqual(related_lookups(UserSerializer, User), ((), ('user_permissions',)))
+        _, prefetch = related_lookups(UserSerializer, User, None, ('orders',))
+        self.assertEqual(prefetch[0], 'user_permissions')
+        self.assertEqual(prefetch[1].prefetch_to, 'orders')
+        # primary key fields only read the foreign key column
+        self.assertEqual(related_lookups(OrderCreateSerializer, Order), ((), ('items',)))
+
+    def test_order_list_queries(self):
+        with patch.object(OrderViewSet, 'use_values', False), CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/orders/?expand=items')
+        # orders with their totals, then items joined with their products; silk adds its own
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"api_' in q['sql']]
+        self.assertEqual(len(selects), 2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        totals = sorted(order['total_price'] for order in response.data)
+        self.assertEqual(totals, [Decimal('9.99'), Decimal('19.98'), Decimal('29.97')])
+
+
+class CompiledSerializerTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', first_name='Ada', last_name='Lovelace')
+        product = Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+        for n in range(3):
+            order = Order.objects.create(user=self.user)
+            OrderItem.objects.create(order=order, product=product, quantity=n + 1)
+
+    def assertSameAsGeneric(self, serializer_class, instances, **kwargs):
+        compiled = CompiledListSerializer(instances, child=serializer_class(**kwargs)).data
+        with generic_serialization():
+            generic = CompiledListSerializer(instances, child=serializer_class(**kwargs)).data
+        self.assertEqual(compiled, generic)
+        self.assertEqual([list(row) for row in compiled], [list(row) for row in generic])
+        return compiled
+
+    def test_output_matches_generic_path(self):
+        expand = ('items', 'items.product', 'user')
+        orders = list(prefetch_queryset(Order.objects.all(), OrderSerializer, None, expand))
+        data = self.assertSameAsGeneric(OrderSerializer, orders, expand=expand)
+        self.assertEqual(data[0]['items'][0]['product']['price'], '9.99')
+        self.assertEqual(data[0]['user']['username'], 'user')
+        # the same names with shallow fields get their own plan
+        self.assertSameAsGeneric(OrderSerializer, orders)
+        self.assertSameAsGeneric(ProductSerializer, list(Product.objects.all()))
+        # method attributes, primary key and many related fields
+        users = self.assertSameAsGeneric(UserSerializer, list(User.objects.all()))
+        self.assertEqual(users[0]['get_full_name'], 'Ada Lovelace')
+
+    def test_compiled_row(self):
+        row = compile_serializer(ProductSerializer())
+        product = Product.objects.get()
+        self.assertEqual(row(product), ProductSerializer(product).data)
+
+    def test_n_plus_one_detector_uses_generic_path(self):
+        with patch('api.compiled.compile_serializer') as compile_mock, \
+                detect_n_plus_one(raise_errors=False):
+            ProductSerializer(Product.objects.all(), many=True).data
+        compile_mock.assert_not_called()
+
+
+class ValuesListTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        self.admin_user = User.objects.create_superuser(
+            username='admin', password='adminpass', first_name='Ada', last_name='Lovelace'
+        )
+        self.client.force_authenticate(self.admin_user)
+        products = [
+            Product.objects.create(name=f'Product {n}', description='', price=Decimal('9.99'), stock=n)
+            for n in range(3)
+        ]
+        for n in range(3):
+            order = Order.objects.create(user=self.admin_user)
+            for product in products[:n + 1]:
+                OrderItem.objects.create(order=order, product=product, quantity=n + 1)
+
+    def test_same_response_as_serializer(self):
+        for url, view in (('/products/', ProductListCreateAPIView),
+                          ('/users/', UserListView),
+                          ('/users/?expand=orders', UserListView),
+                          ('/orders/', OrderViewSet),
+                          ('/orders/?expand=items.product,user', OrderViewSet)):
+            with self.subTest(url=url):
+                reset_caches()
+                expected = self.client.get(url).content
+                reset_caches()
+                with patch.object(view, 'use_values', False):
+                    self.assertEqual(self.client.get(url).content, expected)
+
+    def test_order_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/orders/?expand=items')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # orders with their totals, then the items
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"api_' in q['sql']]
+        self.assertEqual(len(selects), 2)
+        self.assertNotIn('"api_product"."description"', selects[1])
+
+    def test_fields_without_expression_are_rejected(self):
+        class TotalSerializer(OrderSerializer):
+            class Meta(OrderSerializer.Meta):
+                values_expressions = {}
+
+        with self.assertRaisesMessage(ImproperlyConfigured, "'total_price'"):
+            get_projection(TotalSerializer, Order)
+
+
+class FastJSONTestCase(SimpleTestCase):
+    data = {
+        'order_id': uuid.UUID('01a153f9-9524-76da-bc35-8e9593b02804'),
+        'created_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'day': datetime(2024, 5, 1).date(),
+        'total_price': Decimal('29.97'),
+        'items': [{'product_name': 'Caf\u00e9 \u2028 line', 'quantity': 3}],
+        1: None,
+    }
+
+    def test_renders_like_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_indent_and_missing_orjson_use_stdlib(self):
+        expected = JSONRenderer().render(self.data, 'application/json; indent=4')
+        self.assertEqual(FastJSONRenderer().render(self.data, 'application/json; indent=4'), expected)
+        with patch('api.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_parses_like_json_parser(self):
+        body = b'{"status": "Pending", "items": [{"product": 1, "quantity": 2.5}], "note": "Caf\xc3\xa9"}'
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        for invalid in (b'{"status": ', b'{"quantity": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(invalid))
+
+
+class StreamingListTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        self.admin_user = User.objects.create_superuser(username='admin', password='adminpass')
+        self.client.force_authenticate(self.admin_user)
+        product = Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+        for n in range(5):
+            order = Order.objects.create(user=self.admin_user)
+            OrderItem.objects.create(order=order, product=product, quantity=n + 1)
+
+    def get_streamed(self, url, accept):
+        response = self.client.get(url, HTTP_ACCEPT=accept)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    @patch.object(OrderViewSet, 'stream_chunk_size', 2)
+    def test_ndjson(self):
+        expected = self.client.get('/orders/', HTTP_ACCEPT='application/json').json()
+        for use_values in (True, False):
+            with self.subTest(use_values=use_values), patch.object(OrderViewSet, 'use_values', use_values):
+                response, body = self.get_streamed('/orders/', 'application/x-ndjson')
+                self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+                lines = body.decode().splitlines()
+                self.assertEqual([json.loads(line) for line in lines], expected)
+
+    @patch.object(UserListView, 'stream_chunk_size', 2)
+    def test_json_array(self):
+        User.objects.create_user(username='user1')
+        User.objects.create_user(username='user2')
+        expected = self.client.get('/users/').content
+        response, body = self.get_streamed('/users/', 'application/json; stream=true')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(body, expected)
+
+    def test_cached_order_list_varies_on_accept(self):
+        response = self.client.get('/orders/')
+        self.assertIn('Accept', response['Vary'])
+        # a cached JSON list must not answer a streaming request
+        self.get_streamed('/orders/', 'application/x-ndjson')
+
+
+@skipIf(renderers.msgpack is None, 'msgpack is not installed')
+class MessagePackTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        self.admin_user = User.objects.create_superuser(username='admin', password='adminpass')
+        self.client.force_authenticate(self.admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+            order = Order.objects.create(user=self.admin_user)
+            OrderItem.objects.create(order=order, product=self.product, quantity=3)
+
+    def test_order_list_uses_extension_types(self):
+        response = self.client.get('/orders/?expand=items', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        order, = renderers.msgpack.unpackb(
+            response.content, ext_hook=lambda code, data: (code, data), raw=False, timestamp=3
+        )
+        self.assertEqual(order['order_id'][0], renderers.EXT_UUID)
+        self.assertIsInstance(order['created_at'], datetime)
+        self.assertEqual(order['total_price'], (renderers.EXT_DECIMAL, b'29.97'))
+        self.assertEqual(order['items'][0]['item_subtotal'], (renderers.EXT_DECIMAL, b'29.97'))
+
+    def test_round_trip(self):
+        response = self.client.get('/orders/', HTTP_ACCEPT='application/msgpack')
+        order, = MessagePackParser().parse(BytesIO(response.content))
+        self.assertEqual(order['order_id'], Order.objects.get().pk)
+        self.assertEqual(order['created_at'], Order.objects.get().created_at)
+        self.assertEqual(order['total_price'], Decimal('29.97'))
+
+        body = renderers.MessagePackRenderer().render(
+            {'status': 'Pending', 'items': [{'product': self.product.pk, 'quantity': 2}]}
+        )
+        response = self.client.post(
+            '/orders/', body, content_type='application/msgpack', HTTP_ACCEPT='application/msgpack'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(MessagePackParser().parse(BytesIO(response.content))['order_id'], uuid.UUID)
+
+    def test_cached_product_list_varies_on_accept(self):
+        self.assertIn(b'Test Product', self.client.get('/products/').content)
+        response = self.client.get('/products/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(MessagePackParser().parse(BytesIO(response.content))[0]['price'], Decimal('9.99'))
+
+    def test_object_cache_keeps_representations_apart(self):
+        ids_url, detail_url = f'/products/?ids={self.product.pk}', f'/products/{self.product.pk}/'
+        response = self.client.get(ids_url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(MessagePackParser().parse(BytesIO(response.content))[0]['price'], Decimal('9.99'))
+        self.assertEqual(self.client.get(detail_url).json()['price'], '9.99')
+
+        # saves write the JSON form through
+        self.product.price = Decimal('5.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        cache.delete_pattern('*throttle_*')
+        response = self.client.get(ids_url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(MessagePackParser().parse(BytesIO(response.content))[0]['price'], Decimal('5.00'))
+        self.assertEqual(self.client.get(detail_url).json()['price'], '5.00')
+
+    def test_invalid_body(self):
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(BytesIO(b'\x93\x01'))
+
+
+class CompressionTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        for i in range(20):
+            Product.objects.create(name=f'Product {i}', description='A product', price=Decimal('9.99'), stock=10)
+
+    def test_product_list_is_gzipped(self):
+        plain = self.client.get('/products/', HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+
+        response = self.client.get('/products/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_cache_hit_skips_rendering_and_compression(self):
+        encoder = Mock(wraps=compression.ENCODERS['gzip'])
+        with patch.dict(compression.ENCODERS, {'gzip': encoder}), \
+                patch.object(FastJSONRenderer, 'render', autospec=True, side_effect=FastJSONRenderer.render) as render:
+            first = self.client.get('/products/', HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get('/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(encoder.call_count, 1)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(second['Content-Encoding'], 'gzip')
+        self.assertEqual(second.content, first.content)
+
+    def test_encodings_are_cached_apart(self):
+        compressed = self.client.get('/products/', HTTP_ACCEPT_ENCODING='gzip')
+        plain = self.client.get('/products/')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+    def test_small_and_uncached_responses(self):
+        product = Product.objects.first()
+        response = self.client.get(f'/products/{product.pk}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        response = self.client.get('/products/info/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['count'], 20)
+
+    @override_settings(COMPRESSION={'ENABLED': False})
+    def test_disabled(self):
+        response = self.client.get('/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_choose_encoding(self):
+        self.assertEqual(compression.choose_encoding('gzip'), 'gzip')
+        self.assertEqual(compression.choose_encoding('GZIP;q=0.5, identity'), 'gzip')
+        self.assertIsNone(compression.choose_encoding(''))
+        self.assertIsNone(compression.choose_encoding('identity'))
+        self.assertIsNone(compression.choose_encoding('gzip;q=0'))
+        self.assertIsNone(compression.choose_encoding('*;q=0'))
+        self.assertIsNone(compression.choose_encoding('gzip;q=0, deflate'))
+        self.assertEqual(compression.choose_encoding('*'), next(iter(compression.ENCODERS)))
+        with patch.dict(compression.ENCODERS, {'br': Mock()}):
+            self.assertEqual(compression.choose_encoding('gzip;q=0.8, br'), 'br')
+            self.assertEqual(compression.choose_encoding('gzip, br;q=0.5'), 'gzip')
+
+
+class ResponseCacheTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+
+    def stored_records(self):
+        client = cache.client.get_client()
+        return [client.get(key) for key in client.keys('*product_list*') if b'.headers.' not in key]
+
+    def test_stores_the_rendered_bytes(self):
+        response = self.client.get('/products/')
+        record, = self.stored_records()
+        self.assertEqual(record[0], responsecache.VERSION)
+        self.assertTrue(record.endswith(response.content))
+
+        hit = self.client.get('/products/')
+        self.assertEqual(hit.content, response.content)
+        self.assertEqual(hit['Content-Type'], response['Content-Type'])
+        self.assertEqual(hit['Vary'], response['Vary'])
+        self.assertEqual(response['Cache-Control'], 'max-age=900')
+        # counts down from the time the response was stored
+        self.assertIn(hit['Cache-Control'], ('max-age=899', 'max-age=900'))
+        self.assertEqual(int(hit['Content-Length']), len(hit.content))
+
+    def test_pack_round_trip(self):
+        response = HttpResponse(b'{"a": 1}', content_type='application/json', status=200)
+        response['Vary'] = 'Accept, Accept-Encoding'
+        response['Server-Timing'] = 'db;dur=1'
+        response['ETag'] = '"abc"'
+        rebuilt = responsecache.unpack_response(responsecache.pack_response(response, time.time() + 60))
+        self.assertEqual(rebuilt.content, b'{"a": 1}')
+        self.assertEqual(rebuilt['Content-Type'], 'application/json')
+        self.assertEqual(rebuilt['Vary'], 'Accept, Accept-Encoding')
+        self.assertFalse(rebuilt.has_header('Server-Timing'))
+        # validators are computed for each request
+        self.assertFalse(rebuilt.has_header('ETag'))
+        self.assertIn(rebuilt['Cache-Control'], ('max-age=59', 'max-age=60'))
+
+    def test_other_format_versions_are_misses(self):
+        self.client.get('/products/')
+        client = cache.client.get_client()
+        key, = [key for key in client.keys('*product_list*') if b'.headers.' not in key]
+        client.set(key, bytes([responsecache.VERSION + 1]) + client.get(key)[1:])
+        self.assertIsNone(responsecache.unpack_response(client.get(key)))
+
+        registry.reset()
+        self.assertEqual(self.client.get('/products/').status_code, status.HTTP_200_OK)
+        self.assertIn('result="miss"} 1', registry.expose())
+
+    def test_invalidated_by_signals(self):
+        self.client.get('/products/')
+        self.product.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        # the new Product generation is part of the key: the old record is never read again
+        self.assertIn(b'Renamed', self.client.get('/products/').content)
+        self.assertEqual(len(self.stored_records()), 2)
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        cache.delete_pattern('api.generation.*')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user(username='user', password='pass')
+            self.product = Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+            order = Order.objects.create(user=self.user)
+            OrderItem.objects.create(order=order, product=self.product, quantity=3)
+
+    def get(self, url, **headers):
+        # stay under the 2/minute throttles
+        cache.delete_pattern('*throttle_*')
+        return self.client.get(url, **headers)
+
+    def api_queries(self, url, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(url, **headers)
+        return response, [q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"api_' in q['sql']]
+
+    def test_product_list_not_modified(self):
+        response = self.get('/products/')
+        self.assertTrue(response.has_header('Last-Modified'))
+        etag = response['ETag']
+
+        response, queries = self.api_queries('/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(queries, [])
+
+        response = self.get('/products/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.product.stock = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.get('/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_validators_of_cache_hits_are_the_requesters(self):
+        self.get('/products/')
+        admin = User.objects.create_superuser(username='admin', password='adminpass')
+        self.client.force_authenticate(admin)
+        response = self.get('/products/')
+        self.assertEqual(self.get('/products/', HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+        # the body is stored compressed: its ETag is weak, as on a miss
+        self.client.force_authenticate(None)
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(5):
+                Product.objects.create(name=f'Test Product {n}', description='', price=Decimal('9.99'), stock=10)
+        miss = self.get('/products/?name=Test', HTTP_ACCEPT_ENCODING='gzip')
+        hit = self.get('/products/?name=Test', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(hit['Content-Encoding'], 'gzip')
+        self.assertEqual(hit['ETag'], miss['ETag'])
+        self.assertTrue(hit['ETag'].startswith('W/'))
+
+    def test_etag_depends_on_query_and_representation(self):
+        etag = self.get('/products/')['ETag']
+        self.assertNotEqual(self.get('/products/?name=Test')['ETag'], etag)
+        self.assertNotEqual(self.get('/products/', HTTP_ACCEPT='application/json; indent=4')['ETag'], etag)
+
+    def test_order_list_not_modified(self):
+        self.client.force_authenticate(self.user)
+        etag = self.get('/orders/')['ETag']
+        response, queries = self.api_queries('/orders/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=Order.objects.get(), product=self.product, quantity=1)
+        response = self.get('/orders/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]['total_price'], 39.96)
+
+        other = User.objects.create_user(username='other', password='pass')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.get('/orders/', HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                         status.HTTP_200_OK)
+
+    def test_generations_read_once_per_request(self):
+        self.client.force_authenticate(self.user)
+        cache.delete_pattern('api.generation.*')
+        with patch('api.conditional.get_generations', wraps=get_generations) as read:
+            response, queries = self.api_queries('/orders/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # for the ETag, Last-Modified and the response cache key
+        read.assert_called_once_with(Order, Product, User)
+        # a cold cache seeds Order and Product from max(updated_at)
+        self.assertEqual(len([q for q in queries if 'MAX(' in q]), 2)
+
+    def test_generation_bumped_once_on_commit(self):
+        self.client.force_authenticate(self.user)
+        order = Order.objects.get()
+        items = [{'product': self.product.pk, 'quantity': 1}] * 10
+        with self.captureOnCommitCallbacks(execute=True), patch('api.signals.bump_generation') as bump:
+            cache.delete_pattern('*throttle_*')
+            response = self.client.put(f'/orders/{order.pk}/', {'status': 'Pending', 'items': items}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # a list read before the commit must not be cached under the new generation
+            bump.assert_not_called()
+        bump.assert_called_once_with(Order)
+
+    def test_product_detail_not_modified(self):
+        url = f'/products/{self.product.pk}/'
+        etag = self.get(url)['ETag']
+        # validated against the cached representation
+        response, queries = self.api_queries(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Other', description='', price=Decimal('1.00'), stock=1)
+            self.product.save()
+        # the representation is unchanged
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.product.stock = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        self.assertNotEqual(self.get(url, HTTP_ACCEPT='application/json; indent=4')['ETag'], self.get(url)['ETag'])
+        self.assertEqual(self.get('/products/999/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_generation_seeded_from_updated_at(self):
+        cache.delete_pattern('api.generation.*')
+        self.assertEqual(get_generation(Product), Product.objects.get().updated_at.timestamp())
+        # users have no updated_at
+        before = time.time()
+        self.assertGreaterEqual(get_generation(User), before)
+
+
+@override_settings(SYNC={'LAG_SECONDS': 0})
+class ProductSyncTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        self.products = [
+            Product.objects.create(name=f'Product {i}', description='', price=Decimal('9.99'), stock=10)
+            for i in range(3)
+        ]
+
+    def sync(self, cursor=None):
+        cache.delete_pattern('*throttle_*')
+        url = '/products/sync/' if cursor is None else f'/products/sync/?changed_since={cursor}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_full_then_delta(self):
+        first = self.sync()
+        self.assertEqual([p['id'] for p in first['upserts']], [p.pk for p in self.products])
+        self.assertEqual(first['deletions'], [])
+        self.assertEqual(first['upserts'][0]['price'], '9.99')
+        self.assertEqual(first['cursor'], f"{first['upserts'][-1]['updated_at']}~u{self.products[-1].pk}")
+        self.assertFalse(first['has_more'])
+
+        self.assertEqual(
+            self.sync(first['cursor']), {'upserts': [], 'deletions': [], 'cursor': first['cursor'], 'has_more': False}
+        )
+
+        self.products[0].stock = 0
+        self.products[0].save()
+        deleted_pk = self.products[1].pk
+        self.products[1].delete()
+        delta = self.sync(first['cursor'])
+        self.assertEqual([p['id'] for p in delta['upserts']], [self.products[0].pk])
+        self.assertEqual(delta['upserts'][0]['stock'], 0)
+        self.assertEqual(delta['deletions'], [deleted_pk])
+        self.assertGreater(delta['cursor'], first['cursor'])
+        self.assertEqual(self.sync(delta['cursor'])['upserts'], [])
+
+    def test_delta_queries_only_changes(self):
+        cursor = self.sync()['cursor']
+        self.products[2].save()
+        with CaptureQueriesContext(connection) as queries:
+            self.sync(cursor)
+        sql = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"api_' in q['sql']]
+        self.assertEqual(len(sql), 2)
+        self.assertTrue(all('"updated_at" >' in s or '"deleted_at" >' in s for s in sql))
+
+    @override_settings(SYNC={'LAG_SECONDS': 60})
+    def test_recent_changes_wait_for_the_lag(self):
+        # a change this young may have been saved by a transaction that has not committed yet
+        self.assertEqual(self.sync(), {'upserts': [], 'deletions': [], 'cursor': None, 'has_more': False})
+
+        Product.objects.filter(pk=self.products[0].pk).update(updated_at=timezone.now() - timedelta(minutes=2))
+        first = self.sync()
+        self.assertEqual([p['id'] for p in first['upserts']], [self.products[0].pk])
+        self.products[0].delete()
+        self.assertEqual(self.sync(first['cursor'])['deletions'], [])
+
+    @override_settings(SYNC={'LAG_SECONDS': 0, 'PAGE_SIZE': 2})
+    def test_pages(self):
+        # changes of the same instant are ordered by primary key
+        earlier, later = timezone.now() - timedelta(seconds=2), timezone.now() - timedelta(seconds=1)
+        Product.objects.filter(pk__in=[p.pk for p in self.products[:2]]).update(updated_at=earlier)
+        Product.objects.filter(pk=self.products[2].pk).update(updated_at=later)
+        first = self.sync()
+        self.assertEqual([p['id'] for p in first['upserts']], [p.pk for p in self.products[:2]])
+        self.assertTrue(first['has_more'])
+
+        deleted = [self.products[0].pk, self.products[1].pk]
+        self.products[0].delete()
+        self.products[1].delete()
+        # deletions come before the upserts of their instant
+        ProductTombstone.objects.update(deleted_at=later)
+        second = self.sync(first['cursor'])
+        self.assertEqual(second['upserts'], [])
+        self.assertEqual(second['deletions'], deleted)
+        self.assertTrue(second['has_more'])
+
+        third = self.sync(second['cursor'])
+        self.assertEqual([p['id'] for p in third['upserts']], [self.products[2].pk])
+        self.assertFalse(third['has_more'])
+        self.assertEqual(self.sync(third['cursor'])['upserts'], [])
+
+    def test_invalid_cursor(self):
+        for cursor in ('yesterday', '2024-05-01T12:30:00Z~x1', '2024-05-01T12:30:00Z~u'):
+            cache.delete_pattern('*throttle_*')
+            response = self.client.get(f'/products/sync/?changed_since={cursor}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('changed_since', response.json())
+
+    def test_cursor_format(self):
+        value = datetime(2024, 5, 1, 12, 30, 0, 123456, tzinfo=dt_timezone.utc)
+        self.assertEqual(format_cursor(value), '2024-05-01T12:30:00.123456Z')
+        self.assertEqual(parse_cursor(format_cursor(value)), (value, None))
+        self.assertEqual(format_cursor(value, 'u7'), '2024-05-01T12:30:00.123456Z~u7')
+        self.assertEqual(parse_cursor(format_cursor(value, 7), parse_key=int), (value, 7))
+        self.assertEqual(parse_cursor(''), (None, None))
+
+
+@override_settings(SYNC={'LAG_SECONDS': 0})
+class OrderSyncTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        self.user = User.objects.create_user(username='user', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.product = Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+        self.orders = [Order.objects.create(user=self.user) for _ in range(2)]
+        for order in self.orders:
+            OrderItem.objects.create(order=order, product=self.product, quantity=1)
+        Order.objects.create(user=self.other)
+        self.client.force_authenticate(self.user)
+
+    def sync(self, cursor=None):
+        cache.delete_pattern('*throttle_*')
+        url = '/orders/sync/' if cursor is None else f'/orders/sync/?changed_since={cursor}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_full_then_delta(self):
+        first = self.sync()
+        self.assertEqual([o['order_id'] for o in first['orders']], [str(o.pk) for o in self.orders])
+        self.assertEqual(first['orders'][0]['items'][0]['quantity'], 1)
+        self.assertEqual(first['orders'][0]['total_price'], 9.99)
+        self.assertEqual(first['cursor'], f"{first['orders'][-1]['updated_at']}~{self.orders[-1].pk}")
+        self.assertFalse(first['has_more'])
+        self.assertEqual(self.sync(first['cursor']), {'orders': [], 'cursor': first['cursor'], 'has_more': False})
+
+        order = self.orders[0]
+        response = self.client.patch(f'/orders/{order.pk}/', {'status': 'Confirmed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        delta = self.sync(first['cursor'])
+        self.assertEqual([o['status'] for o in delta['orders']], ['Confirmed'])
+
+    def test_item_changes_bump_the_order(self):
+        cursor = self.sync()['cursor']
+        order = self.orders[1]
+        cache.delete_pattern('*throttle_*')
+        response = self.client.put(
+            f'/orders/{order.pk}/', {'status': 'Pending', 'items': [{'product': self.product.pk, 'quantity': 4}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        order.refresh_from_db()
+        self.assertGreater(order.updated_at, parse_cursor(cursor)[0])
+        delta = self.sync(cursor)
+        self.assertEqual([o['order_id'] for o in delta['orders']], [str(order.pk)])
+        self.assertEqual(delta['orders'][0]['items'][0]['quantity'], 4)
+        self.assertEqual(delta['orders'][0]['total_price'], 39.96)
+
+    @override_settings(SYNC={'LAG_SECONDS': 60})
+    def test_recent_changes_wait_for_the_lag(self):
+        self.assertEqual(self.sync(), {'orders': [], 'cursor': None, 'has_more': False})
+        Order.objects.filter(pk=self.orders[0].pk).update(updated_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual([o['order_id'] for o in self.sync()['orders']], [str(self.orders[0].pk)])
+
+    @override_settings(SYNC={'LAG_SECONDS': 0, 'PAGE_SIZE': 1})
+    def test_pages(self):
+        # orders changed at the same instant are ordered by primary key
+        Order.objects.update(updated_at=timezone.now() - timedelta(seconds=1))
+        first = self.sync()
+        self.assertEqual([o['order_id'] for o in first['orders']], [str(self.orders[0].pk)])
+        self.assertTrue(first['has_more'])
+        second = self.sync(first['cursor'])
+        self.assertEqual([o['order_id'] for o in second['orders']], [str(self.orders[1].pk)])
+        self.assertEqual(second['orders'][0]['items'][0]['quantity'], 1)
+        self.assertFalse(second['has_more'])
+        self.assertEqual(self.sync(second['cursor'])['orders'], [])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/orders/sync/?changed_since=2024-05-01T12:30:00Z~1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('changed_since', response.json())
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/orders/sync/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class SparseFieldsetTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        self.admin_user = User.objects.create_superuser(username='admin', password='adminpass')
+        self.client.force_authenticate(self.admin_user)
+        self.product = Product.objects.create(name='Test Product', description='Long text', price=Decimal('9.99'), stock=10)
+        self.order = Order.objects.create(user=self.admin_user)
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=3)
+
+    def get(self, url):
+        cache.delete_pattern('*throttle_*')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json(), [q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"api_' in q['sql']]
+
+    def test_product_list_fields(self):
+        data, queries = self.get('/products/?fields=name,price')
+        self.assertEqual(data, [{'name': 'Test Product', 'price': '9.99'}])
+        self.assertNotIn('"description"', queries[0])
+
+        data, _ = self.get('/products/?omit=description')
+        self.assertEqual(list(data[0]), ['name', 'price', 'stock'])
+
+    def test_order_list_skips_items_and_total(self):
+        for url in ('/orders/?fields=order_id,status', '/orders/?omit=created_at,user,items,total_price'):
+            reset_caches()
+            data, queries = self.get(url)
+            self.assertEqual(data, [{'order_id': str(self.order.pk), 'status': 'Pending'}])
+            order_queries = [q for q in queries if 'FROM "api_order"' in q]
+            self.assertEqual(len(order_queries), 1)
+            self.assertNotIn('SUM', order_queries[0])
+            self.assertFalse(any('"api_orderitem"' in q for q in queries))
+
+    def test_order_detail_narrows_columns(self):
+        data, queries = self.get(f'/orders/{self.order.pk}/?fields=order_id,status')
+        self.assertEqual(data, {'order_id': str(self.order.pk), 'status': 'Pending'})
+        order_query, = [q for q in queries if 'FROM "api_order"' in q]
+        self.assertNotIn('"created_at"', order_query)
+        self.assertFalse(any('"api_orderitem"' in q for q in queries))
+
+        data, queries = self.get(f'/orders/{self.order.pk}/?fields=total_price')
+        self.assertEqual(data, {'total_price': 29.97})
+
+    def test_product_detail_and_users(self):
+        data, _ = self.get(f'/products/{self.product.pk}/?fields=stock')
+        self.assertEqual(data, {'stock': 10})
+        data, _ = self.get('/users/?fields=orders&expand=orders')
+        self.assertEqual([order['order_id'] for order in data[0]['orders']], [str(self.order.pk)])
+
+    def test_unknown_field(self):
+        response = self.client.get('/products/?fields=name,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'fields': ['Unknown field(s): secret.']})
+
+    def test_writes_ignore_the_selection(self):
+        response = self.client.post(
+            '/products/?fields=name', {'name': 'New', 'description': 'd', 'price': '1.50', 'stock': 2}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(set(response.json()), {'name', 'description', 'price', 'stock'})
+
+    def test_column_narrowing(self):
+        self.assertEqual(only_columns(OrderSerializer, Order, ('order_id', 'user', 'items')), ('order_id', 'user'))
+        self.assertEqual(only_columns(OrderSerializer, Order, ('total_price',)), ())
+        self.assertIsNone(only_columns(UserSerializer, User, ('is_authenticated',)))
+        self.assertEqual(related_lookups(OrderSerializer, Order, ('order_id', 'status')), ((), ()))
+
+
+class ExpandTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin_user = User.objects.create_superuser(username='admin', password='adminpass', email='a@b.c')
+            self.product = Product.objects.create(name='Test Product', description='', price=Decimal('9.99'), stock=10)
+            self.order = Order.objects.create(user=self.admin_user)
+            OrderItem.objects.create(order=self.order, product=self.product, quantity=3)
+            Order.objects.create(user=self.admin_user)
+        self.client.force_authenticate(self.admin_user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json(), [q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"api_' in q['sql']]
+
+    def test_shallow_by_default(self):
+        data, queries = self.get('/orders/')
+        self.assertEqual(list(data[0]), ['order_id', 'created_at', 'user', 'status', 'total_price'])
+        self.assertEqual(data[0]['user'], self.admin_user.pk)
+        # an order without items totals 0
+        self.assertEqual(sorted(order['total_price'] for order in data), [0, 29.97])
+        self.assertEqual(len([q for q in queries if 'FROM "api_order"' in q]), 1)
+        self.assertFalse(any('FROM "api_orderitem"' in q for q in queries))
+
+    def test_expand_nested_relations(self):
+        data, queries = self.get('/orders/?expand=items.product,user')
+        order, = [order for order in data if order['order_id'] == str(self.order.pk)]
+        item, = order['items']
+        self.assertEqual(item['product']['name'], 'Test Product')
+        self.assertEqual(item['quantity'], 3)
+        self.assertEqual(order['user'], {'id': self.admin_user.pk, 'username': 'admin', 'email': 'a@b.c'})
+        # orders, then items, products and users once each
+        self.assertEqual(len([q for q in queries if 'FROM "api_order"' in q]), 1)
+        self.assertEqual(len([q for q in queries if 'FROM "api_orderitem"' in q]), 1)
+        self.assertEqual(len([q for q in queries if 'FROM "api_product"' in q]), 1)
+
+        data, _ = self.get('/orders/?expand=items')
+        items = sorted((order['items'] for order in data), key=len)
+        self.assertEqual(items, [[], [{'product': self.product.pk, 'quantity': 3, 'item_subtotal': 29.97}]])
+
+    def test_retrieve_queries(self):
+        url = f'/orders/{self.order.pk}/'
+        data, queries = self.get(url)
+        self.assertNotIn('items', data)
+        self.assertEqual(len([q for q in queries if '"api_order' in q]), 1)
+
+        data, queries = self.get(f'{url}?expand=items.product')
+        self.assertEqual(data['items'][0]['product']['price'], '9.99')
+        self.assertEqual(data['total_price'], 29.97)
+        # the order, then its items joined with their products
+        self.assertEqual(len([q for q in queries if '"api_order' in q]), 2)
+
+        data, _ = self.get(f'{url}?fields=order_id,user&expand=user')
+        self.assertEqual(data, {'order_id': str(self.order.pk), 'user': {
+            'id': self.admin_user.pk, 'username': 'admin', 'email': 'a@b.c'
+        }})
+
+    def test_user_changes_refresh_the_list(self):
+        url = '/orders/?expand=user'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(response.json()[0]['user']['email'], 'a@b.c')
+
+        self.admin_user.email = 'admin@example.com'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin_user.save()
+        cache.delete_pattern('*throttle_*')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['user']['email'], 'admin@example.com')
+
+    def test_expansion_paths(self):
+        self.assertEqual(select_expansion(OrderSerializer, ['items.product', 'user']), ('items', 'items.product', 'user'))
+        self.assertIsNone(select_expansion(OrderSerializer, []))
+        self.assertEqual(select_expansion(UserSerializer, ['orders.items']), ('orders', 'orders.items'))
+
+    def test_unknown_relation(self):
+        response = self.client.get('/orders/?expand=items.secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'expand': ['Unknown relation(s): items.secret.']})
+        cache.delete_pattern('*throttle_*')
+        self.assertEqual(self.client.get('/products/?expand=items').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ObjectCacheTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        self.products = [
+            Product.objects.create(name=f'Product {n}', description='', price=Decimal('9.99'), stock=n)
+            for n in range(3)
+        ]
+
+    def get(self, url):
+        cache.delete_pattern('*throttle_*')
+        cache.delete_pattern('*product_list*')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        product_queries = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "api_product"' in q['sql']]
+        return response, product_queries
+
+    def test_batch_in_requested_order(self):
+        cache.delete_pattern('*api.object.*')
+        first, last = self.products[0], self.products[2]
+        url = f'/products/?ids={last.pk},999,{first.pk}'
+        response, queries = self.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [
+            {'name': 'Product 2', 'description': '', 'price': '9.99', 'stock': 2},
+            None,
+            {'name': 'Product 0', 'description': '', 'price': '9.99', 'stock': 0},
+        ])
+        # the misses in one query
+        self.assertEqual(len([q for q in queries if ' IN (' in q]), 1)
+
+        response, queries = self.get(f'/products/?ids={last.pk},{first.pk}')
+        self.assertEqual(response.json()[0]['name'], 'Product 2')
+        self.assertFalse(any(' IN (' in q for q in queries))
+
+        response, _ = self.get(f'/products/?ids={first.pk}&fields=name,stock')
+        self.assertEqual(response.json(), [{'name': 'Product 0', 'stock': 0}])
+
+    def test_saves_write_through(self):
+        product = self.products[1]
+        product.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        response, queries = self.get(f'/products/{product.pk}/')
+        self.assertEqual(response.json()['name'], 'Renamed')
+        self.assertEqual(queries, [])
+
+        pk = product.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        response, _ = self.get(f'/products/{pk}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get(f'/products/?ids={pk}')[0].json(), [None])
+
+    def test_fills_do_not_overwrite_saves(self):
+        cache.delete_pattern('*api.object.*')
+        product = self.products[0]
+        stale = Product.objects.get(pk=product.pk)
+        product.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        # a request that read the row before the save fills the cache after it
+        queryset = Mock(model=Product)
+        queryset.filter.return_value = [stale]
+        with patch.object(cache, 'get_many', return_value={}):
+            seen, = cached_representations(queryset, ProductSerializer, [product.pk])
+        self.assertEqual(seen['name'], 'Product 0')
+        self.assertEqual(cache.get(object_key(ProductSerializer, Product, product.pk))['name'], 'Renamed')
+
+    def test_invalid_ids(self):
+        for value in ('1,two', ','.join(['1'] * 101)):
+            response, _ = self.get(f'/products/?ids={value}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('ids', response.json())
+
+
+class NegativeCacheTestCase(APITestCase):
+    def setUp(self):
+        reset_caches()
+        self.owner = User.objects.create_user(username='owner', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.order = Order.objects.create(user=self.owner)
+
+    def get(self, url):
+        cache.delete_pattern('*throttle_*')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, response.content)
+        return [q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"api_' in q['sql']]
+
+    def saved(self, model):
+        return negative_cache_saved_queries.values.get((model,), 0)
+
+    def test_missing_product(self):
+        before = self.saved('api.product')
+        first = self.get('/products/999/')
+        # the object lookup
+        self.assertEqual(len(first), 1)
+        self.assertEqual(self.get('/products/999/'), [])
+        self.assertEqual(self.saved('api.product') - before, len(first))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(pk=999, name='Late', description='', price=Decimal('1.00'), stock=1)
+            # uncommitted, so other requests would not see it yet
+            self.assertEqual(self.get('/products/999/'), [])
+        cache.delete_pattern('*throttle_*')
+        self.assertEqual(self.client.get('/products/999/').json()['name'], 'Late')
+
+    def test_missing_order(self):
+        self.client.force_authenticate(self.owner)
+        missing = uuid.uuid4()
+        self.get(f'/orders/{missing}/')
+        queries = self.get(f'/orders/{str(missing).upper()}/')
+        self.assertFalse(any('FROM "api_order"' in q for q in queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(pk=missing, user=self.owner)
+        cache.delete_pattern('*throttle_*')
+        self.assertEqual(self.client.get(f'/orders/{missing}/').status_code, status.HTTP_200_OK)
+
+    def test_orders_of_other_users_are_not_cached(self):
+        self.client.force_authenticate(self.other)
+        for _ in range(2):
+            queries = self.get(f'/orders/{self.order.pk}/')
+            self.assertTrue(any('FROM "api_order"' in q for q in queries))
+        self.client.force_authenticate(self.owner)
+        cache.delete_pattern('*throttle_*')
+        self.assertEqual(self.client.get(f'/orders/{self.order.pk}/').status_code, status.HTTP_200_OK)
@@ -1,7 +1,32 @@
-from rest_framework.throttling import UserRateThrottle
+from rest_framework import throttling
+
+from api.metrics import throttle_rejections
+
+
+class CountRejectionsMixin:
+    """Count the requests a throttle rejects, per scope."""
+
+    def allow_request(self, request, view):
+        allowed = super().allow_request(request, view)
+        if not allowed:
+            throttle_rejections.inc(scope=self.scope)
+        return allowed
+
+
+class AnonRateThrottle(CountRejectionsMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(CountRejectionsMixin, throttling.UserRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(CountRejectionsMixin, throttling.ScopedRateThrottle):
+    pass
+
 
 class BurstRateThrottle(UserRateThrottle):
     scope = 'burst'
     
 class SustainedRateThrottle(UserRateThrottle):
-    scope = 'sustained'
\ No newline at end of file
+    scope = 'sustained'
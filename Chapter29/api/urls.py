@@ -5,8 +5,11 @@ from rest_framework.routers import DefaultRouter
 urlpatterns = [
     path('products/', views.ProductListCreateAPIView.as_view()),
     path('products/info/', views.ProductInfoAPIView.as_view()),
+    path('products/sync/', views.ProductSyncAPIView.as_view()),
     path('products/<int:product_id>/', views.ProductDetailAPIView.as_view(), name='product-detail'),
     path('users/', views.UserListView.as_view()),
+    path('profiling/', views.ProfilingStatsAPIView.as_view()),
+    path('metrics/', views.MetricsAPIView.as_view()),
 ]
 
 router = DefaultRouter()
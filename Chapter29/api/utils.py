@@ -0,0 +1,60 @@
+from django.db import transaction
+
+
+def is_explain(sql):
+    """
+    Whether ``sql`` is an EXPLAIN, which silk and the slow query log run
+    for queries they see; those are not part of the work of a request.
+    """
+    return sql.lstrip()[:7].upper() == 'EXPLAIN'
+
+
+def handler_name(view_func, method):
+    """
+    Name of the handler that will serve ``method``: the viewset action
+    ('list', 'retrieve', ...) for routers, the HTTP method otherwise.
+    """
+    actions = getattr(view_func, 'actions', None) or {}
+    return actions.get(method.lower(), method.lower())
+
+
+def view_label(view_func, method):
+    """
+    Stable name for the view serving a request, e.g. ``OrderViewSet.list``,
+    used to group profiling and metrics samples.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is not None:
+        return f'{view_class.__name__}.{handler_name(view_func, method)}'
+    return getattr(view_func, '__qualname__', None) or type(view_func).__name__
+
+
+class _OnCommit:
+    __slots__ = ('func', 'args', 'pending')
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.pending = True
+
+    def __call__(self):
+        self.pending = False
+        self.func(*self.args)
+
+
+def on_commit_once(func, *args, using=None):
+    """
+    Call ``func(*args)`` once the current transaction on ``using`` commits,
+    and only once however many times it is asked for in that transaction,
+    e.g. by the ``post_save`` of every item of an order. Outside a
+    transaction the write has committed: it is called right away.
+    """
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block:
+        for _, callback, _ in connection.run_on_commit:
+            if (
+                isinstance(callback, _OnCommit) and callback.pending
+                and callback.func is func and callback.args == args
+            ):
+                return
+    transaction.on_commit(_OnCommit(func, args), using=using)
@@ -1,24 +1,41 @@
+import uuid
+
 from django.db.models import Max
+from django.http import HttpResponse
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_headers
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, generics, viewsets
+from rest_framework import filters, generics, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from api.compression import CompressionMixin, compress_page
+from api.conditional import conditional_list
+from api.fieldsets import SparseFieldsetMixin
 from api.filters import InStockFilterBackend, OrderFilter, ProductFilter
-from api.models import Order, Product, User
+from api.instrumentation import ServerTimingMixin
+from api.metrics import get_metrics_settings, registry
+from api.models import Order, Product, ProductTombstone, User
+from api.objectcache import CachedObjectMixin, NegativeCacheMixin
+from api.prefetch import AutoPrefetchMixin
+from api.projection import ValuesListMixin, projection_for
+from api.responsecache import cache_response
+from api.streaming import StreamingListMixin
+from api.sync import changed_after, format_cursor, get_sync_settings, parse_cursor, sync_horizon
+from api.profiling import get_profiler_settings, profiler
 from api.serializers import (OrderCreateSerializer, OrderSerializer,
-                             ProductInfoSerializer, ProductSerializer,
+                             OrderSyncSerializer, ProductInfoSerializer,
+                             ProductSerializer, ProductSyncSerializer,
                              UserSerializer)
-from rest_framework.throttling import ScopedRateThrottle
+from api.throttles import ScopedRateThrottle
 
 
-class ProductListCreateAPIView(generics.ListCreateAPIView):
+class ProductListCreateAPIView(ServerTimingMixin, CompressionMixin, SparseFieldsetMixin, CachedObjectMixin,
+                               ValuesListMixin, generics.ListCreateAPIView):
+    query_budget = {'get': 3, 'post': 3}
     throttle_scope = 'products'
     throttle_classes = [ScopedRateThrottle]
     queryset = Product.objects.order_by('pk')
@@ -34,7 +51,10 @@ class ProductListCreateAPIView(generics.ListCreateAPIView):
     ordering_fields = ['name', 'price', 'stock']
     pagination_class = None
 
-    @method_decorator(cache_page(60 * 15, key_prefix='product_list'))
+    @method_decorator(conditional_list(Product, per_user=False))
+    @method_decorator(cache_response(60 * 15, key_prefix='product_list', depends_on=(Product,)))
+    @method_decorator(vary_on_headers('Accept'))
+    @method_decorator(compress_page)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
     
@@ -48,7 +68,10 @@ class ProductListCreateAPIView(generics.ListCreateAPIView):
         return super().get_permissions()
 
 
-class ProductDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ProductDetailAPIView(ServerTimingMixin, CompressionMixin, NegativeCacheMixin, SparseFieldsetMixin,
+                           CachedObjectMixin, generics.RetrieveUpdateDestroyAPIView):
+    # one query for the ETag, before the object is read
+    query_budget = {'get': 4, 'put': 4, 'patch': 4, 'delete': 8}
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     lookup_url_kwarg = 'product_id'
@@ -60,20 +83,60 @@ class ProductDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         return super().get_permissions()    
     
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ServerTimingMixin, CompressionMixin, NegativeCacheMixin, StreamingListMixin,
+                   SparseFieldsetMixin, ValuesListMixin, AutoPrefetchMixin, viewsets.ModelViewSet):
+    query_budget = {
+        'list': 5,
+        'retrieve': 5,
+        'sync': 5,
+        'create': 10,
+        'update': 14,
+        'partial_update': 14,
+        'destroy': 8,
+    }
     throttle_scope = 'orders'
-    queryset = Order.objects.prefetch_related('items__product')
+    queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = None
     filterset_class = OrderFilter
     filter_backends = [DjangoFilterBackend]
     
-    @method_decorator(cache_page(60 * 15, key_prefix='order_list'))
-    @method_decorator(vary_on_headers("Authorization"))
+    # ?expand=user shows user data too
+    @method_decorator(conditional_list(Order, Product, User))
+    @method_decorator(cache_response(60 * 15, key_prefix='order_list', depends_on=(Order, Product, User)))
+    @method_decorator(vary_on_headers("Authorization", "Accept"))
+    @method_decorator(compress_page)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)    
 
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        The user's orders created or changed since ``?changed_since=<cursor>``
+        (all of them without one), with their items unless ``?expand=`` says
+        otherwise, and the cursor to send next time: at most ``PAGE_SIZE``
+        of them, oldest first, with ``has_more`` set while there are more to
+        fetch, and none changed in the last ``LAG_SECONDS`` (see ``api.sync``).
+        """
+        since, pk = parse_cursor(request.query_params.get('changed_since'), parse_key=uuid.UUID)
+        size = get_sync_settings()['PAGE_SIZE']
+        orders = Order.objects.filter(user=request.user, updated_at__lte=sync_horizon()).order_by('updated_at', 'pk')
+        if since is not None:
+            orders = orders.filter(changed_after('updated_at', since, pk))
+
+        serializer = OrderSyncSerializer(context=self.get_serializer_context(), expand=self.expanded or ('items',))
+        projection = projection_for(serializer, Order)
+        rows = list(projection.values(orders)[:size + 1])
+        page = rows[:size]
+        if page:
+            since, pk = page[-1]['updated_at'], page[-1]['pk']
+        return Response({
+            'orders': projection.render(page, serializer),
+            'cursor': format_cursor(since, pk),
+            'has_more': len(rows) > size,
+        })
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
@@ -101,7 +164,69 @@ class OrderViewSet(viewsets.ModelViewSet):
 #         return qs.filter(user=self.request.user)
 
 
-class ProductInfoAPIView(APIView):
+def _product_change(key):
+    # 'd<tombstone pk>' or 'u<product pk>'
+    kind, pk = key[:1], int(key[1:])
+    if kind not in ('d', 'u'):
+        raise ValueError(key)
+    return kind, pk
+
+
+class ProductSyncAPIView(ServerTimingMixin, CompressionMixin, APIView):
+    """
+    Changes to the catalog since ``?changed_since=<cursor>``: the products
+    created or updated after it, the ids of those deleted after it, and the
+    cursor to send next time. Without a cursor every product is an upsert.
+
+    At most ``PAGE_SIZE`` changes come at a time, oldest first, with
+    ``has_more`` set while there are more to fetch, and none younger than
+    ``LAG_SECONDS`` (see ``api.sync``).
+    """
+    query_budget = 4
+
+    def get(self, request):
+        since, key = parse_cursor(request.query_params.get('changed_since'), parse_key=_product_change)
+        kind, pk = key or (None, None)
+        horizon = sync_horizon()
+        size = get_sync_settings()['PAGE_SIZE']
+        products = Product.objects.filter(updated_at__lte=horizon).order_by('updated_at', 'pk')
+        tombstones = ProductTombstone.objects.filter(deleted_at__lte=horizon).order_by('deleted_at', 'pk')
+        if since is None:
+            # a first sync has nothing to delete
+            tombstones = tombstones.none()
+        else:
+            # deletions sort before the upserts of the same instant
+            if kind == 'd':
+                products = products.filter(updated_at__gte=since)
+                tombstones = tombstones.filter(changed_after('deleted_at', since, pk))
+            else:
+                products = products.filter(changed_after('updated_at', since, pk))
+                tombstones = tombstones.filter(deleted_at__gt=since)
+
+        serializer = ProductSyncSerializer(context={'request': request})
+        projection = projection_for(serializer, Product)
+        rows = list(projection.values(products)[:size + 1])
+        deletions = list(tombstones.values_list('deleted_at', 'pk', 'product_id')[:size + 1])
+
+        changes = sorted(
+            [(row['updated_at'], 'u', row['pk'], row) for row in rows]
+            + [(deleted_at, 'd', tombstone, product_id) for deleted_at, tombstone, product_id in deletions],
+            key=lambda change: change[:3]
+        )
+        page = changes[:size]
+        if page:
+            since, kind, pk, _ = page[-1]
+        return Response({
+            'upserts': projection.render([item for _, change, _, item in page if change == 'u'], serializer),
+            'deletions': [item for _, change, _, item in page if change == 'd'],
+            'cursor': format_cursor(since, None if kind is None else f'{kind}{pk}'),
+            'has_more': len(changes) > size,
+        })
+
+
+class ProductInfoAPIView(ServerTimingMixin, CompressionMixin, APIView):
+    query_budget = 4
+
     def get(self, request):
         products = Product.objects.all()
         serializer = ProductInfoSerializer({
@@ -112,7 +237,45 @@ class ProductInfoAPIView(APIView):
         return Response(serializer.data)
     
     
-class UserListView(generics.ListAPIView):
+class UserListView(ServerTimingMixin, CompressionMixin, StreamingListMixin, SparseFieldsetMixin,
+                   ValuesListMixin, AutoPrefetchMixin, generics.ListAPIView):
+    query_budget = 5
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = None
+
+
+class ProfilingStatsAPIView(ServerTimingMixin, CompressionMixin, APIView):
+    """
+    Per-view timing and SQL statistics collected by the sampling profiler
+    in this process. DELETE clears them.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        options = get_profiler_settings()
+        stats = sorted(profiler.snapshot().items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        return Response({
+            'sample_rate': options['SAMPLE_RATE'],
+            'rules': options['RULES'],
+            'views': [{'view': view, **values} for view, values in stats],
+        })
+
+    def delete(self, request):
+        profiler.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MetricsAPIView(ServerTimingMixin, CompressionMixin, APIView):
+    """
+    Metrics in the Prometheus text format, summed across worker processes
+    when METRICS['MULTIPROCESS_DIR'] is set.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        directory = get_metrics_settings()['MULTIPROCESS_DIR']
+        return HttpResponse(
+            registry.expose(directory),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
@@ -1,3 +1,6 @@
+import os
+import sys
+from importlib.util import find_spec
 from pathlib import Path
 from datetime import timedelta
 
@@ -15,6 +18,8 @@ SECRET_KEY = 'django-insecure-%hjisw!0c0)bs&s9m#0e(#(=g54-#f+q2-d3+p%puk)0=5qrp#
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = []
 
 
@@ -30,22 +35,34 @@ INSTALLED_APPS = [
     'django_extensions',
     'api',
     'rest_framework',
-    'silk',
     'drf_spectacular',
     'django_filters',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.profiling.SamplingProfilerMiddleware',
+    'api.metrics.MetricsMiddleware',
+    'api.slowqueries.SlowQueryViewMiddleware',
+    'api.nplusone.NPlusOneMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'silk.middleware.SilkyMiddleware',
+    'api.middleware.QueryBudgetMiddleware',
 ]
 
+# silk writes every request and every query to the database, so it is
+# only installed for development. Use the sampling profiler (PROFILER)
+# to look at production traffic.
+SILK_ENABLED = DEBUG
+
+if SILK_ENABLED:
+    INSTALLED_APPS.append('silk')
+    MIDDLEWARE.insert(MIDDLEWARE.index('api.middleware.QueryBudgetMiddleware'), 'silk.middleware.SilkyMiddleware')
+
 ROOT_URLCONF = 'drf_course.urls'
 
 TEMPLATES = [
@@ -126,11 +143,21 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # orjson-backed JSON when it is installed, the stdlib otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 2,
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',            
+        'api.throttles.AnonRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '2/minute',
@@ -139,6 +166,11 @@ REST_FRAMEWORK = {
     }    
 }
 
+# MessagePack content negotiation (Accept: application/msgpack) when msgpack is installed
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('api.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('api.parsers.MessagePackParser')
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'E-Commerce API',
     'DESCRIPTION': 'A simple Product & Order API that helps us learn Django REST Framework',
@@ -157,6 +189,65 @@ CACHES = {
     }
 }
 
+# Sampled request profiling, see api/profiling.py. Stats are served at /profiling/
+PROFILER = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.01,
+    'RULES': [
+        ('/admin/', 0),
+        ('/silk/', 0),
+    ],
+    'BUFFER_SIZE': 10_000,
+    'FLUSH_INTERVAL': 5,
+}
+
+# In-process metrics served in the Prometheus format at /metrics/, see api/metrics.py.
+# Set METRICS_MULTIPROC_DIR to a directory shared by the worker processes to
+# aggregate them.
+METRICS = {
+    'ENABLED': True,
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_MULTIPROC_DIR'),
+    'FLUSH_INTERVAL': 10,
+}
+
+# Queries slower than THRESHOLD_MS are logged with their EXPLAIN output,
+# grouped by fingerprint. See api/slowqueries.py and `manage.py slow_queries`.
+SLOW_QUERY_LOG = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 100,
+    'MAX_ENTRIES': 200,
+    'EXPLAIN': True,
+}
+
+# Report serializer fields that run the same query once per instance:
+# logged in development, raised in the test suite. See api/nplusone.py
+NPLUSONE = {
+    'ENABLED': DEBUG or TESTING,
+    'RAISE': TESTING,
+    'THRESHOLD': 2,
+}
+
+# Compress api responses by Accept-Encoding; the cached lists store the compressed body
+COMPRESSION = {
+    'ENABLED': True,
+    'MIN_LENGTH': 200,
+}
+
+# Sync endpoints hand out changes at least LAG_SECONDS old, PAGE_SIZE at a time, see api/sync.py
+SYNC = {
+    'LAG_SECONDS': 5,
+    'PAGE_SIZE': 500,
+}
+
+# Emit a Server-Timing header with a per-phase breakdown from the api views
+SERVER_TIMING = DEBUG
+
+# Per-view SQL query budgets, see api/querybudget.py
+QUERY_BUDGETS = {
+    'ENABLED': DEBUG,
+    'RAISE': False,
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),